@@ -1,69 +1,414 @@
 # Imports
+import argparse
+from dataclasses import replace
+import glob
 import os
 import re
+import sys
+import time
 
 # Dependencies
-import matplotlib
+import numpy as np
 
 # Locals
 from lssParser import *
-from lssGraphs import *
+from lssCache import *
+from lssColumnar import *
+from lssMatrix import *
+from lssSimulation import *
+from lssProfile import *
 
-# prompts the user for a .lss file, if it's valid outputs text files, graphs, and CSVs
-def main():
-    matplotlib.use('TkAgg')
+# every output process_lss_file can write, and the ones it writes unless told otherwise (see process_options)
+OUTPUTS = ('text', 'csv', 'graphs', 'columnar', 'simulation')
+DEFAULT_OUTPUTS = process_options().outputs
+
+# how segment duration graphs are laid out: one image per segment, or pages of them (see get_segment_grid_graphs)
+GRAPH_LAYOUTS = ('individual', 'grid')
+
+# parses the command line, see main()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Reports statistics and graphs from LiveSplit split (.lss) files. '
+                                                 'Without any paths, prompts for files interactively.')
+    parser.add_argument('paths', nargs='*', help='.lss files, directories (searched recursively) or glob patterns')
+    parser.add_argument('-o', '--output-dir', default=os.path.join(os.getcwd(), 'output'), help='folder to write results to (default: ./output)')
+    parser.add_argument('--outputs', nargs='+', choices=OUTPUTS, default=list(DEFAULT_OUTPUTS), metavar='OUTPUT',
+                        help=f'outputs to write, any of {", ".join(OUTPUTS)} (default: {" ".join(DEFAULT_OUTPUTS)})')
+    parser.add_argument('--timing', nargs='+', choices=TIMING_METHODS, default=['RealTime'], metavar='METHOD',
+                        help='timing methods to write outputs for, RealTime and/or GameTime (default: RealTime). '
+                             'GameTime outputs go to a GameTime folder inside the output folder')
+    parser.add_argument('--segment-graphs', choices=GRAPH_LAYOUTS, default='individual',
+                        help='one image per segment, or pages of segment graphs in a grid which is much faster for long routes (default: individual)')
+    parser.add_argument('--graph-points', type=int, metavar='N',
+                        help='longest line each graph draws, longer histories are downsampled keeping golds, worst times and the PB '
+                             '(default: 1000, 400 in the grid layout)')
+    parser.add_argument('--no-rolling-overlay', dest='rolling_overlay', action='store_false',
+                        help="don't draw the rolling median, IQR and standard deviation over the segment graphs, which makes them faster")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes to use, for files in a batch or for the graphs of a single file (default: one per core)')
+    parser.add_argument('--stats-workers', type=int, default=1, metavar='N',
+                        help='processes to spread the segment statistics of a single file across, sharing its histories through shared memory. '
+                             'only worth it for files with hundreds of segments and tens of thousands of attempts (default: 1)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print errors and failed files')
+    parser.add_argument('--database', metavar='SQLITE', help='also add every processed file to this SQLite database (see lssDatabase.py)')
+    parser.add_argument('-w', '--watch', action='store_true', help='keep watching a single .lss file and update the outputs whenever it is saved')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between checks for changes with --watch (default: 0.5)')
+    parser.add_argument('--profile', metavar='JSON', help='write a timing report of every stage to this file')
+    parser.add_argument('--profile-allocations', action='store_true', help='include memory use in the --profile report')
+    parser.add_argument('--cprofile', metavar='PATH', help='also save a cProfile capture (requires --profile)')
+    
+    args = parser.parse_args(argv)
+    if args.watch and (len(args.paths) != 1 or not os.path.isfile(args.paths[0])):
+        parser.error('--watch needs exactly one .lss file')
+    if args.cprofile and not args.profile:
+        parser.error('--cprofile requires --profile')
+    return args
+
+# command line entry point, returns the exit code: 1 if any file failed, 0 otherwise
+def main(argv=None):
+    args = parse_args(argv)
+    
+    # graphs are only ever saved to files, so render headless. set through the environment so
+    # matplotlib isn't imported unless graphs are written, and batch workers inherit it
+    os.environ['MPLBACKEND'] = 'Agg'
+    set_quiet(args.quiet)
+    if args.profile:
+        enable_profiling(args.profile_allocations, args.cprofile is not None)
+    options = process_options(outputs=tuple(args.outputs), timing_methods=tuple(args.timing), graph_layout=args.segment_graphs,
+                              graph_points=args.graph_points, rolling_overlay=args.rolling_overlay, graph_workers=args.workers,
+                              stats_workers=args.stats_workers)
+    
+    try:
+        if args.watch:
+            file_name = os.path.splitext(os.path.basename(args.paths[0]))[0]
+            try:
+                failed = not watch_lss_file(args.paths[0], os.path.join(args.output_dir, file_name), options, args.interval, args.database)
+            except (FileNotFoundError, ET.ParseError, ValueError) as e:
+                print(f'Error: {e}')
+                failed = True
+            except KeyboardInterrupt:
+                failed = False
+        elif args.paths:
+            results = run_batch(args.paths, args.output_dir, args.workers, options, args.database)
+            failed = not results or any(error for _, _, error in results)
+        else:
+            prompt_for_files(args.output_dir, args.workers, options, args.database)
+            failed = False
+    finally:
+        if args.profile:
+            disable_profiling()
+            write_profile_report(args.profile, args.cprofile)
+    
+    return 1 if failed else 0
+
+# prompts the user for a .lss file, if it's valid writes its outputs as set by options (a process_options(), default if None).
+# a directory or glob pattern processes every .lss file it matches in parallel across workers processes.
+# with a database path every file that was processed is added to it (see lssDatabase.py)
+def prompt_for_files(output_root, workers, options=None, database=None):
     while True:
         try:
-            lss_file = input('Enter the path to a valid .lss file (or "q" to quit): ')
+            lss_file = input('Enter the path to a valid .lss file, a directory or a glob pattern (or "q" to quit): ')
             # check if user wants to quit
             if lss_file.lower() == 'q' or lss_file.lower() == 'quit':
                 break
-            # make sure it's a .lss file
-            if not lss_file.lower().endswith('.lss'):
-                raise ValueError('Invalid file format. File must be of type .lss')
+            if os.path.isdir(lss_file) or glob.has_magic(lss_file):
+                run_batch([lss_file], output_root, workers, options, database)
+                continue
+            
+            # get the name of the file & the folder for output
+            file_name = os.path.splitext(os.path.basename(lss_file))[0]
+            folder_path = os.path.join(output_root, file_name)
+            
+            if not process_lss_file(lss_file, folder_path, options):
+                print('Failed to open', lss_file)
             else:
-                # check first two lines 
-                with open(lss_file, 'r') as file:
-                    header = [file.readline() for _ in range(2)]
-                    if not header[0].startswith('ï»¿<?xml version="1.0" encoding="UTF-8"?>'):
-                        raise ValueError('Invalid XML version header')
-                    if not header[1].strip().startswith('<Run version='):
-                        raise ValueError('Missing <Run> tag.')
-                result = open_lss_file(lss_file)
-                if result:
-                    # get the name of the file & create a folder for output
-                    file_name = os.path.splitext(os.path.basename(lss_file))[0]
-                    folder_path = os.path.join(os.getcwd(), 'output\\' + file_name)
-                    os.makedirs(folder_path, exist_ok=True)
-                    print('Created directory', folder_path)
-                    
-                    split_data = read_lss_file(result, folder_path)
-                
-                    write_split_stats(split_data, folder_path, file_name)
-                    write_graphs(split_data, folder_path)
-                    
-                    folder_path = os.path.join(os.getcwd(), 'output\\' + file_name + '\\csv\\')
-                    os.makedirs(folder_path, exist_ok=True)
-                    print('Created directory', folder_path)
-                    write_csvs(split_data, folder_path, file_name)
-                else:
-                    print('Failed to open', lss_file)
+                add_to_database(database, [(lss_file, folder_path)])
                     
         except (FileNotFoundError, ET.ParseError, ValueError) as e:
             print(f'Error: {e}')
 
+# makes sure a file is a .lss file by checking its extension and first two lines, raises ValueError if not
+def check_lss_file(lss_file):
+    if not lss_file.lower().endswith('.lss'):
+        raise ValueError('Invalid file format. File must be of type .lss')
+    
+    # LiveSplit writes a UTF-8 byte order mark before the XML declaration
+    with open(lss_file, 'r', encoding='utf-8-sig') as file:
+        header = [file.readline() for _ in range(2)]
+        if not header[0].startswith('<?xml version="1.0" encoding="UTF-8"?>'):
+            raise ValueError('Invalid XML version header')
+        if not header[1].strip().startswith('<Run version='):
+            raise ValueError('Missing <Run> tag.')
+
+# reads a .lss file and writes the outputs selected by options (a process_options(), default if None) to folder_path:
+# text file, graphs, CSVs and columnar file for each of its timing methods.
+# returns the lss() data structure or None if the file couldn't be read
+@profiled()
+def process_lss_file(lss_file, folder_path, options=None):
+    options = options or process_options()
+    check_lss_file(lss_file)
+    file_name = os.path.splitext(os.path.basename(lss_file))[0]
+    
+    # only attempts added since the last run are parsed (see lssCache.py), every timing method comes from the same read
+    split_data = read_lss_file_cached(lss_file, folder_path, options.stats_workers)
+    if split_data:
+        os.makedirs(folder_path, exist_ok=True)
+        log('Created directory', folder_path)
+        write_outputs(split_data, folder_path, file_name, options)
+    
+    return split_data
+
+# where the outputs for a timing method go: RealTime straight into folder_path, others into a folder named after them
+def get_timing_folder(folder_path, timing_method):
+    return folder_path if timing_method == 'RealTime' else os.path.join(folder_path, timing_method)
+
+# writes the outputs of an lss() selected by options (a process_options(), default if None) for each of its timing methods
+# (see get_timing_folder), a timing method the file has no times for is skipped. segment_indexes limits which segment CSVs
+# and graphs are rewritten (default all). the rolling statistics are calculated once for the CSVs and the segment graphs,
+# which only draw them with options.rolling_overlay
+def write_outputs(split_data, folder_path, file_name, options=None, segment_indexes=None):
+    options = options or process_options()
+    outputs = options.outputs
+    timings = get_timings(split_data)
+    for timing_method in options.timing_methods:
+        if timing_method not in timings:
+            log(f'No {timing_method} times in {file_name}, skipping its outputs')
+            continue
+        timing = timings[timing_method]
+        timing_folder_path = get_timing_folder(folder_path, timing_method)
+        if timing_folder_path != folder_path:
+            os.makedirs(timing_folder_path, exist_ok=True)
+            log('Created directory', timing_folder_path)
+        
+        rolling = None
+        if 'csv' in outputs or ('graphs' in outputs and options.rolling_overlay and options.graph_layout != 'grid'):
+            rolling = get_all_rolling_stats(timing, segment_indexes)
+        
+        if 'text' in outputs:
+            write_split_stats(timing, timing_folder_path, file_name)
+        if 'graphs' in outputs:
+            write_graphs(timing, timing_folder_path, options.graph_workers, segment_indexes, options.graph_layout, options.graph_points,
+                         rolling if options.rolling_overlay else None)
+        if 'csv' in outputs:
+            csv_folder_path = os.path.join(timing_folder_path, 'csv')
+            os.makedirs(csv_folder_path, exist_ok=True)
+            log('Created directory', csv_folder_path)
+            write_csvs(timing, csv_folder_path, file_name, segment_indexes, rolling)
+        if 'columnar' in outputs:
+            write_columnar(timing, timing_folder_path, file_name)
+        if 'simulation' in outputs:
+            try:
+                write_simulation(simulate_runs(timing, workers=options.graph_workers), timing_folder_path, file_name)
+            except ValueError as error:
+                print(f'Could not simulate {file_name}: {error}')
+
+# sets up a batch worker process the same way main() set up this one
+def init_worker(quiet):
+    set_quiet(quiet)
+
+# runs process_lss_file, returns the file, how long it took and the error (None on success)
+def process_lss_file_timed(lss_file, folder_path, options=None):
+    start = time.perf_counter()
+    try:
+        error = None if process_lss_file(lss_file, folder_path, options) else 'Failed to open'
+    # one bad file shouldn't take down the rest of the batch
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return lss_file, time.perf_counter() - start, error
+
+# finds every .lss file in the given directories (including subdirectories) or matching the given glob patterns,
+# paths to single files are kept as they are so invalid files get reported
+def find_lss_files(paths):
+    lss_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, '**', '*.lss')
+        elif not glob.has_magic(path):
+            lss_files.append(path)
+            continue
+        lss_files += sorted(file for file in glob.glob(path, recursive=True) if file.lower().endswith('.lss'))
+    
+    # the same file can match more than one path
+    return list(dict.fromkeys(lss_files))
+
+# processes every .lss file found by find_lss_files with options (a process_options(), default if None), outputs go to output_root
+# mirroring the folders the files were found in. a single file is processed here with its graphs spread over the workers
+# and its statistics over options.stats_workers (see build_lss_file), more than one are spread over a process pool
+# of workers and each renders its graphs and reads its statistics in a single process.
+# prints how long each file took and any files that failed, returns (file, seconds, error) for each file.
+# with a database path every file that was processed is added to it afterwards (see lssDatabase.py)
+def run_batch(paths, output_root, workers=None, options=None, database=None):
+    options = options or process_options()
+    lss_files = find_lss_files(paths)
+    if not lss_files:
+        print('No .lss files found for', ' '.join(paths))
+        return []
+    workers = workers or os.cpu_count() or 1
+    
+    start = time.perf_counter()
+    if len(lss_files) == 1:
+        file_name = os.path.splitext(os.path.basename(lss_files[0]))[0]
+        folder_paths = [os.path.join(output_root, file_name)]
+        results = [process_lss_file_timed(lss_files[0], folder_paths[0], replace(options, graph_workers=workers))]
+        log(f'{results[0][1]:8.2f}s  {"FAILED" if results[0][2] else "ok":6}  {lss_files[0]}')
+    else:
+        # keep files with the same name in different folders apart
+        base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(file)) for file in lss_files])
+        folder_paths = [os.path.join(output_root, os.path.relpath(os.path.splitext(os.path.abspath(file))[0], base_dir)) for file in lss_files]
+        
+        workers = min(workers, len(lss_files))
+        log(f'Processing {len(lss_files)} .lss files with {workers} worker(s)')
+        
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        file_options = replace(options, graph_workers=1, stats_workers=1)
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(is_quiet(),)) as executor:
+            futures = [executor.submit(process_lss_file_timed, file, folder, file_options) for file, folder in zip(lss_files, folder_paths)]
+            for future in as_completed(futures):
+                lss_file, elapsed, error = future.result()
+                results.append((lss_file, elapsed, error))
+                log(f'{elapsed:8.2f}s  {"FAILED" if error else "ok":6}  {lss_file}')
+    
+    failures = [(lss_file, error) for lss_file, _, error in results if error]
+    log(f'Processed {len(lss_files) - len(failures)}/{len(lss_files)} files in {time.perf_counter() - start:.2f}s')
+    for lss_file, error in failures:
+        print(f'Failed: {lss_file}: {error}')
+    
+    failed_files = {lss_file for lss_file, _ in failures}
+    add_to_database(database, [(lss_file, folder_path) for lss_file, folder_path in zip(lss_files, folder_paths) if lss_file not in failed_files])
+    
+    return results
+
+# adds every processed (lss_file, folder_path) to the SQLite database at database_path, reading them from their caches
+# (see ingest_lss_files). does nothing without a database
+def add_to_database(database_path, processed_files):
+    if database_path:
+        from lssDatabase import ingest_lss_files
+        ingest_lss_files(database_path, processed_files)
+
+# indexes of the segments in split_data whose history, gold or PB differ from previous_data in any timing method
+def get_changed_segments(split_data, previous_data):
+    changed = []
+    timings = [(split_data, previous_data), (split_data.game_time, previous_data.game_time)]
+    for index in range(len(split_data.segments)):
+        for timing, previous_timing in timings:
+            current_segment = timing.segments[index]
+            previous_segment = previous_timing.segments[index] if index < len(previous_timing.segments) else None
+            if (previous_segment is None or current_segment.name != previous_segment.name
+                    or current_segment.segment_gold.time != previous_segment.segment_gold.time
+                    or current_segment.split_time_pb != previous_segment.split_time_pb
+                    or not np.array_equal(current_segment.segment_history.ids, previous_segment.segment_history.ids)):
+                changed.append(index)
+                break
+    return changed
+
+# updates the running_stats() of each segment for a new read of the file: times added after
+# the ones already counted are folded in, a segment whose history changed in any other way is recounted
+def update_segment_running_stats(running, split_data, previous_data):
+    updated = []
+    for index, current_segment in enumerate(split_data.segments):
+        times = current_segment.segment_history.times
+        ids = current_segment.segment_history.ids
+        previous_ids = previous_data.segments[index].segment_history.ids if previous_data is not None and index < len(previous_data.segments) else None
+        
+        if previous_ids is not None and index < len(running) and len(previous_ids) <= len(ids) and np.array_equal(ids[:len(previous_ids)], previous_ids):
+            updated.append(update_running_stats(running[index], times[len(previous_ids):]))
+        else:
+            updated.append(make_running_stats(times))
+    return updated
+
+# writes the running statistics kept while watching a file to <file_name>_live.csv:
+# count, mean, standard deviation, quartiles and best/worst of every time in each segment
+def write_running_stats(split_data, running, folder_path, file_name):
+    file_path = os.path.join(folder_path, f'{file_name}_live.csv')
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('segment,count,mean,std dev,q1,median,q3,best,worst\n')
+        for current_segment, segment_running in zip(split_data.segments, running):
+            mean = segment_running.mean if segment_running.count > 0 else None
+            quartiles = [format_realtime(get_running_quantile(segment_running, i)) for i in range(len(RUNNING_QUANTILES))]
+            file.write(f'{current_segment.name}, {segment_running.count}, {format_realtime(mean)}, {format_realtime(get_running_std_dev(segment_running))}, '
+                       f'{", ".join(quartiles)}, {format_realtime(segment_running.best)}, {format_realtime(segment_running.worst)}\n')
+    log('Successfully output running statistics to', file_path)
+
+# updates the running statistics (see update_segment_running_stats) of each of timing_methods the file has times for
+# and writes them next to its other outputs, returns them as {timing method: [running_stats()]}
+def write_all_running_stats(split_data, previous_data, running, folder_path, file_name, timing_methods):
+    timings = get_timings(split_data)
+    previous_timings = get_timings(previous_data) if previous_data is not None else {}
+    updated = {}
+    for timing_method in timing_methods:
+        if timing_method not in timings:
+            continue
+        updated[timing_method] = update_segment_running_stats(running.get(timing_method, []), timings[timing_method], previous_timings.get(timing_method))
+        write_running_stats(timings[timing_method], updated[timing_method], get_timing_folder(folder_path, timing_method), file_name)
+    return updated
+
+# processes a .lss file, then keeps watching it and updates the outputs every time it's saved (e.g. after each reset in LiveSplit).
+# changes are found by polling the file every interval seconds. only attempts and times added since the last save are parsed,
+# only the segments they changed are recalculated, and only their CSVs and graphs are rewritten along with the text, columnar
+# and running statistics, as set by options (a process_options(), default if None). with a database path the file is added
+# to it again after every save. runs until interrupted (Ctrl+C), returns False if the file couldn't be read the first time
+def watch_lss_file(lss_file, folder_path, options=None, interval=0.5, database=None):
+    options = options or process_options()
+    file_name = os.path.splitext(os.path.basename(lss_file))[0]
+    split_data = process_lss_file(lss_file, folder_path, options)
+    if not split_data:
+        return False
+    add_to_database(database, [(lss_file, folder_path)])
+    
+    # timing method -> running_stats() of each segment
+    running = write_all_running_stats(split_data, None, {}, folder_path, file_name, options.timing_methods)
+    file_state = (os.stat(lss_file).st_mtime_ns, os.stat(lss_file).st_size)
+    log(f'Watching {lss_file} for changes (Ctrl+C to stop)')
+    
+    while True:
+        time.sleep(interval)
+        
+        # LiveSplit replaces the file when it saves, so it can briefly be missing
+        try:
+            stat = os.stat(lss_file)
+        except FileNotFoundError:
+            continue
+        if (stat.st_mtime_ns, stat.st_size) == file_state:
+            continue
+        
+        start = time.perf_counter()
+        file_hash = get_file_hash(lss_file)
+        cache = lss_cache(CACHE_VERSION, file_hash, max(split_data.attempts, default=0), split_data)
+        new_data = stream_lss_file(lss_file, folder_path, cache, options.stats_workers)
+        
+        # a file caught halfway through being saved is read again on the next poll
+        if not new_data:
+            continue
+        file_state = (stat.st_mtime_ns, stat.st_size)
+        
+        # the header changed or segments were added/removed, everything is rewritten
+        if len(new_data.segments) != len(split_data.segments):
+            changed = None
+        else:
+            changed = get_changed_segments(new_data, split_data)
+        
+        write_outputs(new_data, folder_path, file_name, options, changed)
+        running = write_all_running_stats(new_data, split_data, running, folder_path, file_name, options.timing_methods)
+        save_cache(get_cache_path(lss_file, folder_path), file_hash, new_data)
+        add_to_database(database, [(lss_file, folder_path)])
+        
+        split_data = new_data
+        log(f'Updated {len(split_data.segments) if changed is None else len(changed)} segment(s) in {time.perf_counter() - start:.3f}s')
+
 # writes data collected and calculated from the .lss file to a .txt file
+@profiled()
 def write_split_stats(split_data, folder_path, file_name):
-    file_path = f'{folder_path}\\{file_name}_output.txt'
+    file_path = os.path.join(folder_path, f'{file_name}_output.txt')
     with open(file_path, 'w', encoding='utf-8') as file:
         file.write(f'Game Name:      {split_data.game_name}\n')
         file.write(f'Category Name:  {split_data.category_name}\n')
         file.write(f'Layout Path:    {split_data.layout_path}\n')
         file.write(f'Timer Offset:   {split_data.timer_offset}\n')
+        file.write(f'Timing Method:  {TIMING_METHOD_NAMES[split_data.timing_method]}\n')
         file.write(f'Runs Started:   {split_data.runs_started}\n')
         file.write(f'Runs Finished:  {split_data.runs_finished}\n')
-        file.write(f'Total Runtime:  {split_data.total_runtime}\n')
-        file.write(f'Total Playtime: {split_data.total_playtime}\n')
+        file.write(f'Total Runtime:  {seconds_to_playtime(split_data.total_runtime)}\n')
+        file.write(f'Total Playtime: {seconds_to_playtime(split_data.total_playtime)}\n')
         file.write('\nSegments\n')
         
         file.write('\nNOTE: averages and medians are more heavily weighted towards recent runs.\n')
@@ -72,65 +417,121 @@ def write_split_stats(split_data, folder_path, file_name):
         
         for index, current_segment in enumerate(split_data.segments, start=1):
             file.write(f'{index}. {current_segment.name.encode("utf-8").decode("utf-8")}\n')
-            file.write(f'    - Split Time (PB):    {current_segment.split_time_pb}\n')
-            file.write(f'    - Segment Time (PB):  {current_segment.segment_pb}\n')
-            file.write(f'    - Best Time:          {current_segment.segment_gold.time}, on attempt {current_segment.segment_gold.id}, which started on {current_segment.segment_gold.run_date} at {current_segment.segment_gold.run_time}.\n')
-            file.write(f'    - Worst Time:         {current_segment.segment_worst.time}, on attempt {current_segment.segment_worst.id}, which started on {current_segment.segment_worst.run_date} at {current_segment.segment_worst.run_time}.\n')
-            file.write(f'    - Average Time:       {current_segment.stats.average}\n')
-            file.write(f'    - Median Time:        {current_segment.stats.median}\n')
-            file.write(f'    - Std Deviation:      {current_segment.stats.stdev}\n')
-            file.write(f'    - Possible Time Save: {current_segment.possible_time_save}\n')
-            file.write(f'    - This segment is completed {current_segment.stats.finished_rate} of the time.\n')
-            file.write(f'    - This segment is within 3% of gold {current_segment.stats.decent_rate} of the time.\n\n')
+            gold, worst, summary = current_segment.segment_gold, current_segment.segment_worst, current_segment.summary
+            gold_date, gold_time = format_started(gold.started)
+            worst_date, worst_time = format_started(worst.started)
+            file.write(f'    - Split Time (PB):    {format_realtime(current_segment.split_time_pb)}\n')
+            file.write(f'    - Segment Time (PB):  {format_time(current_segment.segment_pb)}\n')
+            file.write(f'    - Best Time:          {format_realtime(gold.time)}, on attempt {format_id(gold.id)}, which started on {gold_date} at {gold_time}.\n')
+            file.write(f'    - Worst Time:         {format_realtime(worst.time, "00:00:00")}, on attempt {format_id(worst.id)}, which started on {worst_date} at {worst_time}.\n')
+            file.write(f'    - Average Time:       {format_time(summary.average)}\n')
+            file.write(f'    - Median Time:        {format_time(summary.median)}\n')
+            file.write(f'    - Std Deviation:      {format_time(summary.stdev)}\n')
+            file.write(f'    - Possible Time Save: {format_time(current_segment.possible_time_save)}\n')
+            if len(current_segment.skipped_history) > 0:
+                file.write(f'    - {len(current_segment.skipped_history)} times also cover a skipped split and are left out of these statistics.\n')
+            file.write(f'    - This segment is completed {format_rate(current_segment.finished_rate, "? %")} of the time.\n')
+            file.write(f'    - This segment is within 3% of gold {format_rate(summary.decent_rate, "0")} of the time.\n\n')
             
-    print('Successfully output .lss data to', file_path)
+    log('Successfully output .lss data to', file_path)
 
 # creates and outputs a number of graphs to a file:
-# * Line graph: segment duration over time (1 for each segment)
+# * Line graph: segment duration over time (1 for each segment, or pages of them)
 # * Bar graph: standard deviation for each segment
 # * Bar graph: percentage of above average segments
 # * Bar graph: possible time save in PB
 # * Line graph: Run duration over time
-def write_graphs(split_data, folder_path):
+# segment graphs are spread across graph_workers processes, segment_indexes limits which are redrawn (default all).
+# with the 'grid' graph_layout the segment graphs are drawn a page at a time instead (see get_segment_grid_graphs).
+# line graphs are downsampled to graph_points points, None for the defaults (see downsample_series).
+# rolling ({segment index: rolling_stats()}, see get_all_rolling_stats) is drawn over the individual segment graphs, None for no overlay
+@profiled()
+def write_graphs(split_data, folder_path, graph_workers=1, segment_indexes=None, graph_layout='individual', graph_points=None, rolling=None):
+    # matplotlib takes longer to import than a text-only run takes, so only load it when graphs are wanted
+    from lssGraphs import get_segment_duration_graphs, get_segment_grid_graphs, get_graphs, GRAPH_POINTS, GRID_POINTS
+    
     segment_names = []
     
     # get list of all segment names
     for current_segment in split_data.segments:
         segment_names.append(current_segment.name)
     
-    # dictionary to store all of the segment duration graphs
-    get_segment_duration_graphs(split_data, folder_path)
-    print('Successfully output segment graphs to', folder_path)
+    # each segment duration graph is saved as soon as it's rendered
+    if graph_layout == 'grid':
+        get_segment_grid_graphs(split_data, folder_path, graph_workers, segment_indexes, graph_points or GRID_POINTS)
+    else:
+        get_segment_duration_graphs(split_data, folder_path, graph_workers, segment_indexes, graph_points or GRAPH_POINTS, rolling)
+    log('Successfully output segment graphs to', folder_path)
 
     # list to store the other graphs
-    get_graphs(split_data, segment_names, folder_path)
-    print('Successfully output other graphs to', folder_path)
+    get_graphs(split_data, segment_names, folder_path, graph_points or GRAPH_POINTS)
+    log('Successfully output other graphs to', folder_path)
+
+# writes a CSV row for each attempt id: the id, then its time in each of columns (seconds, see seconds_to_realtimes)
+def write_time_rows(file, ids, *columns):
+    formatted = [seconds_to_realtimes(column).tolist() for column in columns]
+    file.writelines(', '.join(map(str, row)) + '\n' for row in zip(ids.tolist(), *formatted))
 
 # Creates CSVs:
 # 1. CSV for PB stats - segment time, gold time, split time
-# 3. CSV for each segment: entire segment history
-def write_csvs(split_data, folder_path, file_name):
+# 2. CSV for resets - how many attempts reached, finished and reset in each segment (see get_reset_funnel)
+# 3. CSV for the sum of best after every attempt (see get_sum_of_best_timeline)
+# 4. CSV for each segment: entire segment history (only the segments in segment_indexes if given)
+# 5. CSV for each segment: rolling median, quartiles, IQR and standard deviation after every time
+#    (rolling if given as {segment index: rolling_stats()}, otherwise they're calculated, see get_all_rolling_stats)
+@profiled()
+def write_csvs(split_data, folder_path, file_name, segment_indexes=None, rolling=None):
     sanitize_filename = lambda filename: re.sub(r'[\/:*?"<>|]', '', filename)
     
-    file_path = f'{folder_path}\\{file_name}_PB.csv'
+    file_path = os.path.join(folder_path, f'{file_name}_PB.csv')
     with open(file_path, 'w', encoding='utf-8') as file:
         file.write(f'segment,time,gold,split time\n')
         for index in range(len(split_data.segments)):
-            file.write(f'{split_data.segments[index].name}, {split_data.segments[index].segment_pb}, {split_data.segments[index].segment_gold.time}, {split_data.segments[index].split_time_pb}\n')
-    print('Successfully output PB segments, gold segments, and split times to CSV.')
+            current_segment = split_data.segments[index]
+            file.write(f'{current_segment.name}, {format_time(current_segment.segment_pb)}, {format_realtime(current_segment.segment_gold.time)}, {format_realtime(current_segment.split_time_pb)}\n')
+    log('Successfully output PB segments, gold segments, and split times to CSV.')
+    
+    funnel = get_reset_funnel(build_attempt_matrix(split_data))
+    rates = [[format_rate(rate) for rate in rates.tolist()] for rates in (funnel.reset_rate, funnel.completion_rate, funnel.run_completion_rate)]
+    file_path = os.path.join(folder_path, f'{file_name}_resets.csv')
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('segment,reached,resets,reset rate,segment finished,run finished\n')
+        for index, current_segment in enumerate(split_data.segments):
+            file.write(f'{current_segment.name}, {funnel.reached[index]}, {funnel.resets[index]}, {rates[0][index]}, {rates[1][index]}, {rates[2][index]}\n')
+    log('Successfully output reset rates to CSV.')
+    
+    sob_ids, sob_times = get_sum_of_best_timeline(build_attempt_matrix(split_data, include_skipped=False))
+    file_path = os.path.join(folder_path, f'{file_name}_sum_of_best.csv')
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('attempt,sum of best\n')
+        write_time_rows(file, sob_ids, sob_times)
+    log('Successfully output sum of best timeline to CSV.')
     
     histories = []
-    for index in range(len(split_data.segments)):
-        file_path = f'{folder_path}\\{file_name}_segment_history_{sanitize_filename(split_data.segments[index].name)}.csv'
+    if segment_indexes is None:
+        segment_indexes = range(len(split_data.segments))
+    for index in segment_indexes:
+        file_path = os.path.join(folder_path, f'{file_name}_segment_history_{sanitize_filename(split_data.segments[index].name)}.csv')
         with open(file_path, 'w', encoding='utf-8') as file:
             file.write(f'attempt,time\n')
         histories.append(file_path)
     
-    for index in range(len(histories)):
-        with open(histories[index], 'a', encoding='utf-8') as file:
-            for key, value in split_data.segments[index].segment_history.items():
-                file.write(f'{key}, {value}\n')
-    print('Successfully output segment history to CSV.')
+    for index, history_path in zip(segment_indexes, histories):
+        with open(history_path, 'a', encoding='utf-8') as file:
+            segment_history = split_data.segments[index].segment_history
+            write_time_rows(file, segment_history.ids, segment_history.times)
+    log('Successfully output segment history to CSV.')
+    
+    if rolling is None:
+        rolling = get_all_rolling_stats(split_data, segment_indexes)
+    for index in segment_indexes:
+        file_path = os.path.join(folder_path, f'{file_name}_segment_rolling_{sanitize_filename(split_data.segments[index].name)}.csv')
+        segment_rolling = rolling[index]
+        with open(file_path, 'w', encoding='utf-8') as file:
+            file.write('attempt,median,q1,q3,iqr,stdev\n')
+            write_time_rows(file, segment_rolling.ids, segment_rolling.median, segment_rolling.q1, segment_rolling.q3,
+                            segment_rolling.q3 - segment_rolling.q1, segment_rolling.stdev)
+    log('Successfully output rolling segment statistics to CSV.')
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -1,37 +1,158 @@
 # Imports
 from dataclasses import dataclass, field
+from datetime import datetime
 
-@dataclass
-# holds statistics for a segment
-class segment_stats:
-    average: str = ''
-    stdev: str = ''
-    decent_rate: str = ''
-    finished_rate: str = ''
-    median: str = ''
-    improvement_over_time: str = ''
-
-@dataclass
+# Dependencies
+import numpy as np
+
+# every structure is a slots dataclass holding numbers (times in seconds, rates in percent,
+# attempt ids as ints, None when missing), they're only formatted as text when written out
+
+@dataclass(slots=True)
+# holds every statistic for a segment in seconds, filled in one pass by get_segment_summary()
+class segment_summary:
+    count: int = 0
+    total: float = 0.0
+    best: float = None
+    best_id: int = None
+    worst: float = None
+    worst_id: int = None
+    gold_id: int = None
+    q1: float = None
+    q3: float = None
+    average: float = None
+    median: float = None
+    stdev: float = None
+    decent_rate: float = None
+
+@dataclass(slots=True)
 # holds the segment time, id, and date/time that the associated run was started
 class segment_time:
-    time: str = ''
-    id: str = ''
-    run_date: str = ''
-    run_time: str = ''
+    time: float = None
+    id: int = None
+    started: datetime = None
+
+@dataclass(slots=True)
+# holds one <Attempt> from <AttemptHistory>, dates are parsed once when the attempt is read
+class attempt_data:
+    id: int = 0
+    started: datetime = None
+    ended: datetime = None
+    
+    # None if the run wasn't finished (or, for game_time, wasn't timed with game time)
+    real_time: float = None
+    game_time: float = None
+
+@dataclass(slots=True)
+# holds <SegmentHistory> as parallel arrays: attempt ids and <RealTime> (or <GameTime>) in seconds
+class time_history:
+    ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    times: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    
+    def __len__(self):
+        return len(self.ids)
+
+@dataclass(slots=True)
+# aggregates of a segment's history that are updated a few times at a time while watching a file
+# (see update_running_stats): count, sum, Welford mean/variance and P² sketches of the quartiles
+class running_stats:
+    count: int = 0
+    total: float = 0.0
+    mean: float = 0.0
+    
+    # sum of squared differences from the mean
+    m2: float = 0.0
+    best: float = None
+    worst: float = None
+    
+    # for each of RUNNING_QUANTILES: marker heights, actual and desired marker positions,
+    # times are collected in first_times until there are enough to place the markers
+    heights: list = field(default_factory=list)
+    positions: list = field(default_factory=list)
+    desired: list = field(default_factory=list)
+    first_times: list = field(default_factory=list)
+
+@dataclass(slots=True)
+# statistics of a segment's last few times after every attempt (see get_rolling_stats), one value per time in its history
+class rolling_stats:
+    window: int = 0
+    ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    q1: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    median: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    q3: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    stdev: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+
+@dataclass(slots=True)
+# every attempt's segment times as one dense matrix, built from the segment histories by build_attempt_matrix()
+class attempt_matrix:
+    # one row per <Attempt> in <AttemptHistory>, in the same order as lss.attempts
+    attempt_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    
+    # attempts x segments in seconds, NaN where the attempt has no time: it didn't reach the segment or skipped
+    # the split (then its next time covers the skipped segments too)
+    times: np.ndarray = field(default_factory=lambda: np.empty((0, 0), dtype=np.float64))
+    
+    # whether each attempt finished the run
+    finished: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=bool))
+
+@dataclass(slots=True)
+# where runs end, per segment, see get_reset_funnel()
+class reset_funnel:
+    # attempts that started the segment, finished it, and reset in it
+    reached: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    completed: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    resets: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    
+    # percentages of the attempts that reached the segment: reset in it, finished it, went on to finish the run.
+    # NaN for segments no attempt reached
+    reset_rate: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    completion_rate: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    run_completion_rate: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
 
-@dataclass
+@dataclass(slots=True)
+# the outcome of simulate_runs(), times in seconds
+class simulation_result:
+    runs: int = 0
+    seed: int = 0
+    
+    # the PB split time of the last segment, None if there isn't one
+    pb: float = None
+    
+    # how many simulated runs weren't reset, and their finish times
+    finished: int = 0
+    finish_times: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    
+    # percentage of simulated attempts that beat pb, and of the finished ones. None without a PB
+    pb_chance: float = None
+    pb_chance_finished: float = None
+
+@dataclass(slots=True)
 # holds basic info for each segment, including detailed stats on best/worst segments
 class segment_data:
     name: str = ''
-    split_time_pb: str = ''
-    segment_pb: str = ''
+    split_time_pb: float = None
+    segment_pb: float = None
     segment_gold: segment_time = field(default_factory=segment_time)
     segment_worst: segment_time = field(default_factory=segment_time)
-    segment_history: dict = field(default_factory=dict)
-    stats: segment_stats = field(default_factory=segment_stats)
-    possible_time_save: str = ''
+    segment_history: time_history = field(default_factory=time_history)
+    
+    # history before times covering a skipped previous split were removed, the number of <Time> elements
+    # it was read from and the oldest attempt among them (both including skipped splits)
+    raw_history: time_history = field(default_factory=time_history)
+    time_count: int = 0
+    oldest_attempt_id: int = None
+    
+    # the removed times, each covering every segment from skipped_from (index into lss.segments) up to this one
+    skipped_history: time_history = field(default_factory=time_history)
+    skipped_from: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    summary: segment_summary = field(default_factory=segment_summary)
+    possible_time_save: float = 0.0
+    
+    # percentage of attempts that finished this segment, None if none did
+    finished_rate: float = None
         
-@dataclass
+@dataclass(slots=True)
+# everything read from a .lss file, timed with one timing method (see TIMING_METHODS)
 class lss:
     game_name: str = ''
     category_name: str = ''
@@ -39,19 +160,56 @@ class lss:
     timer_offset: str = ''
     output_dir: str = ''
     
+    # 'RealTime' or 'GameTime', every time below is measured with it
+    timing_method: str = 'RealTime'
+    
     # attempts and completed runs
     runs_started: int = 0
     runs_finished: int = 0
     
     # completion percentage
     completed: float = 0.0
+    
+    # attempt id -> run time of every finished run
     finished_run_times: dict = field(default_factory=dict)
     
+    # attempt id -> attempt_data(), built once from <AttemptHistory>
+    attempts: dict = field(default_factory=dict)
+    
     # list of segments
     segments: list = field(default_factory=list)
     
     # sum of best, total playtime
-    sob: str = ''
-    total_runtime: str = ''
-    total_playtime: str = ''
+    sob: float = 0.0
+    total_runtime: float = 0.0
+    total_playtime: float = 0.0
+    
+    # the same file timed with <GameTime>, read in the same pass (set on the RealTime lss() only)
+    game_time: 'lss' = None
+
+@dataclass(slots=True)
+# an earlier read of a .lss file, stored in the output folder so later runs only parse new attempts
+class lss_cache:
+    version: int = 0
+    file_hash: str = ''
+    
+    # highest attempt id in the file when it was cached
+    high_water_mark: int = 0
+    split_file: lss = field(default_factory=lss)
+
+@dataclass(slots=True)
+# how process_lss_file() reads a file and writes its outputs, set from the command line by main()
+class process_options:
+    # which outputs to write (see OUTPUTS in liveSplitStats.py) for which timing methods (see TIMING_METHODS)
+    outputs: tuple = ('text', 'csv', 'graphs', 'columnar')
+    timing_methods: tuple = ('RealTime',)
+    
+    # segment graphs: 'individual' or 'grid' (see GRAPH_LAYOUTS), the most points a line draws (None for the default),
+    # whether the rolling statistics are drawn over them and how many processes render them
+    graph_layout: str = 'individual'
+    graph_points: int = None
+    rolling_overlay: bool = True
+    graph_workers: int = 1
     
+    # processes the segment statistics of a single file are spread across (see build_lss_file)
+    stats_workers: int = 1
@@ -0,0 +1,232 @@
+# Imports
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Dependencies
+import numpy as np
+
+# Locals
+from liveSplitStats import *
+
+#-----------------------------------
+# Synthetic .lss files
+#-----------------------------------
+
+# per-segment reset probabilities: 'flat' resets equally often everywhere,
+# 'early' mostly resets in the first few segments, 'late' mostly near the end
+def get_reset_probabilities(segment_count, reset_rate, reset_distribution):
+    position = np.linspace(0, 1, segment_count)
+    if reset_distribution == 'early':
+        shape = np.exp(-4 * position)
+    elif reset_distribution == 'late':
+        shape = np.exp(-4 * (1 - position))
+    else:
+        shape = np.ones(segment_count)
+    return np.clip(reset_rate * shape / shape.mean(), 0, 1)
+
+# writes a realistic LiveSplit file with segment_count segments and attempt_count attempts.
+# segment times improve over time with noise and the odd mistake, runs reset according to
+# reset_rate/reset_distribution (see get_reset_probabilities) and skip_rate of splits are skipped
+# (the skipped segment gets an empty <Time> and its time is added to the next segment, like LiveSplit does).
+# returns the number of <Time> entries written
+def make_synthetic_lss(file_path, segment_count=50, attempt_count=5000, reset_rate=0.03, reset_distribution='early', skip_rate=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+
+    # segment times: a learning curve, run-to-run noise and occasional big mistakes
+    base_times = rng.uniform(20, 180, segment_count)
+    learning_curve = 1.15 - 0.15 * np.sqrt(np.linspace(0, 1, attempt_count))
+    times = base_times * learning_curve[:, None] * (1 + np.abs(rng.normal(0, 0.04, (attempt_count, segment_count))))
+    mistakes = rng.random((attempt_count, segment_count)) < 0.05
+    times += mistakes * rng.exponential(0.2 * base_times, (attempt_count, segment_count))
+
+    # a run resets during the first segment it fails to finish
+    resets = rng.random((attempt_count, segment_count)) < get_reset_probabilities(segment_count, reset_rate, reset_distribution)
+    finished_segments = np.where(resets.any(axis=1), resets.argmax(axis=1), segment_count)
+    reached = np.arange(segment_count) < finished_segments[:, None]
+
+    # skipped splits fold their time into the next finished segment
+    skipped = reached & (rng.random((attempt_count, segment_count)) < skip_rate)
+    skipped[:, -1] = False
+    skipped &= np.roll(reached, -1, axis=1)
+    recorded_times = np.where(reached, times, np.nan)
+    for segment in range(segment_count - 1):
+        rows = skipped[:, segment]
+        recorded_times[rows, segment + 1] += recorded_times[rows, segment]
+    recorded_times[skipped] = np.nan
+
+    finished = finished_segments == segment_count
+    run_times = np.where(finished, np.nansum(np.where(reached, times, 0), axis=1), np.nan)
+
+    # attempts are spread over sessions, with a short break between runs
+    durations = np.nansum(np.where(reached, times, 0), axis=1) + rng.uniform(2, 15, attempt_count)
+    gaps = rng.exponential(120, attempt_count) + np.where(rng.random(attempt_count) < 0.02, 86400, 0)
+    started_offsets = np.cumsum(gaps + np.concatenate(([0], durations[:-1])))
+    start_date = datetime(2022, 1, 1)
+    date_format = '%m/%d/%Y %H:%M:%S'
+
+    # PB split times and golds come from the (unskipped) data
+    pb = np.nanargmin(run_times) if finished.any() else None
+    golds = np.nanmin(np.where(skipped | ~reached, np.nan, recorded_times), axis=0)
+
+    recorded_strings = seconds_to_realtimes(recorded_times)
+    time_count = 0
+    with open(file_path, 'w', encoding='utf-8-sig', newline='\r\n') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        file.write('<Run version="1.7.0">\n')
+        file.write('  <GameIcon />\n')
+        file.write('  <GameName>Synthetic Game</GameName>\n')
+        file.write(f'  <CategoryName>{segment_count} Segments</CategoryName>\n')
+        file.write('  <Metadata>\n    <Run id="" />\n    <Platform usesEmulator="False">\n    </Platform>\n    <Region>\n    </Region>\n    <Variables />\n  </Metadata>\n')
+        file.write('  <Offset>00:00:00</Offset>\n')
+        file.write(f'  <AttemptCount>{attempt_count}</AttemptCount>\n')
+
+        file.write('  <AttemptHistory>\n')
+        run_time_strings = seconds_to_realtimes(run_times)
+        for attempt in range(attempt_count):
+            started = (start_date + timedelta(seconds=float(started_offsets[attempt]))).strftime(date_format)
+            ended = (start_date + timedelta(seconds=float(started_offsets[attempt] + durations[attempt]))).strftime(date_format)
+            attributes = f'id="{attempt + 1}" started="{started}" isStartedSynced="True" ended="{ended}" isEndedSynced="True"'
+            if finished[attempt]:
+                file.write(f'    <Attempt {attributes}>\n      <RealTime>{run_time_strings[attempt]}</RealTime>\n    </Attempt>\n')
+            else:
+                file.write(f'    <Attempt {attributes} />\n')
+        file.write('  </AttemptHistory>\n')
+
+        file.write('  <Segments>\n')
+        pb_split_times = seconds_to_realtimes(np.cumsum(times[pb])) if pb is not None else [''] * segment_count
+        gold_strings = seconds_to_realtimes(golds)
+        for segment in range(segment_count):
+            file.write('    <Segment>\n')
+            file.write(f'      <Name>Segment {segment + 1}</Name>\n')
+            file.write('      <Icon />\n')
+            file.write('      <SplitTimes>\n        <SplitTime name="Personal Best">\n')
+            if pb_split_times[segment]:
+                file.write(f'          <RealTime>{pb_split_times[segment]}</RealTime>\n')
+            file.write('        </SplitTime>\n      </SplitTimes>\n')
+            file.write(f'      <BestSegmentTime>\n        <RealTime>{gold_strings[segment]}</RealTime>\n      </BestSegmentTime>\n')
+
+            file.write('      <SegmentHistory>\n')
+            attempts = np.flatnonzero(reached[:, segment])
+            for attempt in attempts:
+                if skipped[attempt, segment]:
+                    file.write(f'        <Time id="{attempt + 1}" />\n')
+                else:
+                    file.write(f'        <Time id="{attempt + 1}">\n          <RealTime>{recorded_strings[attempt, segment]}</RealTime>\n        </Time>\n')
+            time_count += len(attempts)
+            file.write('      </SegmentHistory>\n')
+            file.write('    </Segment>\n')
+        file.write('  </Segments>\n')
+        file.write('  <AutoSplitterSettings />\n')
+        file.write('</Run>\n')
+
+    return time_count
+
+#-----------------------------------
+# Pipeline stages
+#-----------------------------------
+
+# runs stage() once untraced for its wall time, then (if measure_memory) again under
+# tracemalloc for its peak allocation. returns (result, seconds, peak bytes or None)
+def time_stage(stage, measure_memory):
+    start = time.perf_counter()
+    result = stage()
+    elapsed = time.perf_counter() - start
+
+    peak = None
+    if measure_memory:
+        tracemalloc.start()
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+# reconciles skipped splits and recomputes the statistics of every segment of an already parsed file
+def analyze_segments(split_data):
+    last_seen = np.full(0, -1, dtype=np.int32)
+    previous_oldest_id = None
+    for index, current_segment in enumerate(split_data.segments):
+        (current_segment.segment_history, current_segment.skipped_history,
+         current_segment.skipped_from, last_seen) = reconcile_skipped_splits(last_seen, index, previous_oldest_id, current_segment.raw_history)
+        analyze_segment(current_segment)
+        previous_oldest_id = current_segment.oldest_attempt_id
+
+# times each pipeline stage on one synthetic file, returns a list of result dicts
+def run_benchmark(segment_count, attempt_count, reset_rate, reset_distribution, skip_rate, seed, graphs, measure_memory):
+    results = []
+    with tempfile.TemporaryDirectory() as folder_path:
+        lss_file = os.path.join(folder_path, 'synthetic.lss')
+        time_count = make_synthetic_lss(lss_file, segment_count, attempt_count, reset_rate, reset_distribution, skip_rate, seed)
+        file_size = os.path.getsize(lss_file)
+
+        csv_folder_path = os.path.join(folder_path, 'csv')
+        os.makedirs(csv_folder_path)
+
+        split_data = stream_lss_file(lss_file, folder_path)
+        stages = [
+            ('parse', lambda: stream_lss_file(lss_file, folder_path)),
+            ('segment stats', lambda: analyze_segments(split_data)),
+            ('text output', lambda: write_split_stats(split_data, folder_path, 'synthetic')),
+            ('csv output', lambda: write_csvs(split_data, csv_folder_path, 'synthetic')),
+            ('columnar output', lambda: write_columnar(split_data, folder_path, 'synthetic')),
+        ]
+        if graphs:
+            stages.append(('graphs', lambda: write_graphs(split_data, folder_path)))
+
+        for name, stage in stages:
+            _, elapsed, peak = time_stage(stage, measure_memory)
+            results.append({
+                'segments': segment_count,
+                'attempts': attempt_count,
+                'times': time_count,
+                'file_mb': file_size / 2**20,
+                'stage': name,
+                'seconds': elapsed,
+                'times_per_second': time_count / elapsed if elapsed > 0 else float('inf'),
+                'peak_mb': peak / 2**20 if peak is not None else None,
+            })
+    return results
+
+# prints benchmark results as a table
+def print_results(results):
+    print(f'{"segments":>8} {"attempts":>8} {"times":>9} {"file MB":>8}  {"stage":<16} {"seconds":>9} {"times/s":>12} {"peak MB":>8}')
+    for result in results:
+        peak = f'{result["peak_mb"]:8.1f}' if result['peak_mb'] is not None else f'{"-":>8}'
+        print(f'{result["segments"]:8} {result["attempts"]:8} {result["times"]:9} {result["file_mb"]:8.1f}  {result["stage"]:<16} '
+              f'{result["seconds"]:9.3f} {result["times_per_second"]:12,.0f} {peak}')
+
+# benchmarks every combination of the given segment and attempt counts, e.g.
+# python lssBenchmark.py --segments 20 100 --attempts 1000 10000 --json bench.json
+def main():
+    parser = argparse.ArgumentParser(description='Time each stage of the pipeline on synthetic .lss files.')
+    parser.add_argument('--segments', type=int, nargs='+', default=[50], help='segment counts to test')
+    parser.add_argument('--attempts', type=int, nargs='+', default=[5000], help='attempt counts to test')
+    parser.add_argument('--reset-rate', type=float, default=0.03, help='average chance of resetting in each segment')
+    parser.add_argument('--reset-distribution', choices=['flat', 'early', 'late'], default='early', help='where in the run resets happen')
+    parser.add_argument('--skip-rate', type=float, default=0.01, help='chance of skipping each split')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-graphs', action='store_true', help="don't time graph rendering")
+    parser.add_argument('--no-memory', action='store_true', help="don't measure peak memory (each stage otherwise runs twice)")
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    os.environ['MPLBACKEND'] = 'Agg'
+    # stage functions log their own progress messages, keep the table readable
+    set_quiet(True)
+    results = []
+    for segment_count in args.segments:
+        for attempt_count in args.attempts:
+            results += run_benchmark(segment_count, attempt_count, args.reset_rate, args.reset_distribution,
+                                     args.skip_rate, args.seed, not args.no_graphs, not args.no_memory)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == '__main__':
+    main()
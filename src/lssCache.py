@@ -0,0 +1,67 @@
+# Imports
+import hashlib
+import os
+import pickle
+
+# Locals
+from lssParser import *
+
+# bump whenever lss.py changes so old caches are ignored instead of half-loaded
+CACHE_VERSION = 4
+
+# path of the cache for a .lss file inside its output folder
+def get_cache_path(lss_file, folder_path):
+    file_name = os.path.splitext(os.path.basename(lss_file))[0]
+    return os.path.join(folder_path, f'{file_name}_cache.pickle')
+
+# sha256 of a file's contents
+def get_file_hash(file_path):
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+# loads an lss_cache(), returns None if there isn't one or it can't be used
+def load_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as file:
+            cache = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+    if not isinstance(cache, lss_cache) or cache.version != CACHE_VERSION:
+        return None
+    return cache
+
+# saves split_file as the lss_cache() for a file with the given hash
+def save_cache(cache_path, file_hash, split_file):
+    cache = lss_cache(CACHE_VERSION, file_hash, max(split_file.attempts, default=0), split_file)
+
+    # write to a temporary file first so an interrupted run can't leave a broken cache behind
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        pickle.dump(cache, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, cache_path)
+
+# reads a .lss file using the cache in folder_path:
+# * file unchanged since it was cached: nothing is parsed
+# * file changed: only attempts and times after the cached high water mark are parsed,
+#   and only segments whose history changed get their statistics recomputed (across stats_workers processes, see build_lss_file)
+# the cache is updated afterwards. returns the lss() data structure or None if the file couldn't be read
+@profiled()
+def read_lss_file_cached(lss_file, folder_path, stats_workers=1):
+    cache_path = get_cache_path(lss_file, folder_path)
+    file_hash = get_file_hash(lss_file)
+    cache = load_cache(cache_path)
+
+    if cache is not None and cache.file_hash == file_hash:
+        split_file = cache.split_file
+        split_file.output_dir = folder_path
+        return split_file
+
+    split_file = stream_lss_file(lss_file, folder_path, cache, stats_workers)
+    if split_file:
+        os.makedirs(folder_path, exist_ok=True)
+        save_cache(cache_path, file_hash, split_file)
+    return split_file
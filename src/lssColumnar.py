@@ -0,0 +1,142 @@
+# Imports
+import os
+import struct
+import zipfile
+
+# Dependencies
+import numpy as np
+
+# Locals
+from lssHelper import log, get_attempt_time
+from lssMatrix import build_attempt_matrix
+from lssProfile import profiled
+
+# attempt ids that don't exist (manual golds, empty segments) are stored as this
+MISSING_ID = -1
+
+# converts a list of attempt ids where None means none to an int32 array
+def ids_to_array(ids):
+    return np.array([MISSING_ID if attempt_id is None else attempt_id for attempt_id in ids], dtype=np.int32)
+
+# converts a list of times in seconds where None means missing to a float64 array with NaN for missing
+def times_to_array(times):
+    return np.array([np.nan if time is None else time for time in times], dtype=np.float64)
+
+# converts a list of datetimes where None means missing to a datetime64 array
+def datetimes_to_array(datetimes):
+    return np.array(['NaT' if value is None else value for value in datetimes], dtype='datetime64[s]')
+
+# builds every column written by write_columnar:
+# * file info: game_name, category_name, layout_path, timer_offset, timing_method, sob, total_runtime, total_playtime (in seconds)
+# * attempts: attempt_id, attempt_started, attempt_ended, attempt_time (NaN if not finished)
+# every time is measured with split_data.timing_method
+# * segments (PB/gold table): segment_name, split_time_pb, segment_pb, gold, gold_id, worst, worst_id,
+#   possible_time_save, average, median, stdev, decent_rate (all times in seconds)
+# * histories: history_attempt and history_time for every segment back to back,
+#   segment i's history is history_offsets[i]:history_offsets[i + 1]
+# * attempt_segment_time: attempts x segments with every attempt's time in every segment, one row per entry of the
+#   attempt_id column in the same (file) order, not sorted by id (see build_attempt_matrix)
+def get_columns(split_data):
+    columns = {
+        'game_name': np.array(split_data.game_name),
+        'category_name': np.array(split_data.category_name),
+        'layout_path': np.array(split_data.layout_path),
+        'timer_offset': np.array(split_data.timer_offset),
+        'timing_method': np.array(split_data.timing_method),
+        'sob': np.array(split_data.sob),
+        'total_runtime': np.array(split_data.total_runtime),
+        'total_playtime': np.array(split_data.total_playtime),
+    }
+
+    attempts = list(split_data.attempts.values())
+    columns['attempt_id'] = np.array([attempt.id for attempt in attempts], dtype=np.int32)
+    columns['attempt_started'] = datetimes_to_array([attempt.started for attempt in attempts])
+    columns['attempt_ended'] = datetimes_to_array([attempt.ended for attempt in attempts])
+    columns['attempt_time'] = times_to_array([get_attempt_time(attempt, split_data.timing_method) for attempt in attempts])
+
+    segments = split_data.segments
+    columns['segment_name'] = np.array([segment.name for segment in segments], dtype=np.str_)
+    columns['split_time_pb'] = times_to_array([segment.split_time_pb for segment in segments])
+    columns['segment_pb'] = times_to_array([segment.segment_pb for segment in segments])
+    columns['gold'] = times_to_array([segment.segment_gold.time for segment in segments])
+    columns['gold_id'] = ids_to_array([segment.segment_gold.id for segment in segments])
+    columns['worst'] = times_to_array([segment.summary.worst for segment in segments])
+    columns['worst_id'] = ids_to_array([segment.segment_worst.id for segment in segments])
+    columns['possible_time_save'] = times_to_array([segment.possible_time_save for segment in segments])
+    for stat in ('average', 'median', 'stdev', 'decent_rate'):
+        columns[stat] = times_to_array([getattr(segment.summary, stat) for segment in segments])
+
+    histories = [segment.segment_history for segment in segments]
+    columns['history_offsets'] = np.concatenate(([0], np.cumsum([len(history) for history in histories]))).astype(np.int64)
+    columns['history_attempt'] = np.concatenate([history.ids for history in histories] + [np.empty(0, dtype=np.int32)])
+    columns['history_time'] = np.concatenate([history.times for history in histories] + [np.empty(0, dtype=np.float64)])
+    columns['attempt_segment_time'] = build_attempt_matrix(split_data).times
+
+    return columns
+
+# writes all segment histories, attempts and the PB/gold table to a single uncompressed
+# <file_name>_columns.npz (see get_columns), which load_columnar can memory-map back in.
+# if pyarrow is installed the histories are also written as a <file_name>_histories.parquet table
+@profiled()
+def write_columnar(split_data, folder_path, file_name):
+    columns = get_columns(split_data)
+
+    # np.savez stores arrays uncompressed, which is what lets load_columnar map them
+    file_path = os.path.join(folder_path, f'{file_name}_columns.npz')
+    np.savez(file_path, **columns)
+    log('Successfully output columnar data to', file_path)
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return
+
+    # one row per history time, with the segment it belongs to and when the attempt started
+    segment_index = np.repeat(np.arange(len(split_data.segments), dtype=np.int32), np.diff(columns['history_offsets']))
+    started = dict(zip(columns['attempt_id'].tolist(), columns['attempt_started']))
+    table = pa.table({
+        'segment': segment_index,
+        'segment_name': pa.DictionaryArray.from_arrays(segment_index, pa.array(columns['segment_name'].tolist(), pa.string())),
+        'attempt': columns['history_attempt'],
+        'time': columns['history_time'],
+        'started': np.array([started.get(attempt_id, np.datetime64('NaT')) for attempt_id in columns['history_attempt'].tolist()], dtype='datetime64[s]'),
+    }, metadata={'game_name': split_data.game_name, 'category_name': split_data.category_name, 'timing_method': split_data.timing_method})
+    file_path = os.path.join(folder_path, f'{file_name}_histories.parquet')
+    pq.write_table(table, file_path)
+    log('Successfully output segment histories to', file_path)
+
+# reads a file written by write_columnar, returns a dict of column name -> array.
+# arrays are memory-mapped straight out of the .npz, so nothing is read until it's used
+def load_columnar(file_path):
+    columns = {}
+    with zipfile.ZipFile(file_path) as archive, open(file_path, 'rb') as file:
+        for info in archive.infolist():
+            name = os.path.splitext(info.filename)[0]
+
+            # skip past the zip local file header to the start of the .npy data
+            file.seek(info.header_offset)
+            local_header = file.read(30)
+            name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+
+            # compressed members and scalars can't (or needn't) be mapped
+            if info.compress_type != zipfile.ZIP_STORED or dtype.hasobject or len(shape) == 0 or 0 in shape:
+                with archive.open(info) as member:
+                    columns[name] = np.lib.format.read_array(member)
+                continue
+
+            columns[name] = np.memmap(file_path, dtype=dtype, mode='r', offset=file.tell(), shape=shape, order='F' if fortran_order else 'C')
+
+    return columns
+
+# the history of one segment from columns loaded by load_columnar, as (attempt ids, times in seconds)
+def get_columnar_history(columns, index):
+    start, end = columns['history_offsets'][index], columns['history_offsets'][index + 1]
+    return columns['history_attempt'][start:end], columns['history_time'][start:end]
@@ -0,0 +1,242 @@
+# Imports
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+
+# Locals
+from lssCache import *
+
+# one row per file, the rest of the tables hang off files.id:
+# * files: where it came from, its hash when it was ingested and the run totals
+# * attempts: every <Attempt>, times in seconds, dates as 'YYYY-MM-DD HH:MM:SS' so they sort
+# * segments: the PB/gold table with each segment's statistics
+# * segment_times: every segment history time, covers_from is the first segment a time covers
+#   when it includes skipped splits (NULL otherwise)
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    file_hash TEXT NOT NULL,
+    game_name TEXT NOT NULL,
+    category_name TEXT NOT NULL,
+    runs_started INTEGER NOT NULL,
+    runs_finished INTEGER NOT NULL,
+    sob REAL,
+    total_runtime REAL,
+    total_playtime REAL
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    attempt_id INTEGER NOT NULL,
+    started TEXT,
+    ended TEXT,
+    real_time REAL,
+    PRIMARY KEY (file_id, attempt_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS segments (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    segment_index INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    split_time_pb REAL,
+    segment_pb REAL,
+    gold REAL,
+    gold_attempt_id INTEGER,
+    worst REAL,
+    worst_attempt_id INTEGER,
+    average REAL,
+    median REAL,
+    stdev REAL,
+    finished_rate REAL,
+    decent_rate REAL,
+    PRIMARY KEY (file_id, segment_index)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS segment_times (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    segment_index INTEGER NOT NULL,
+    attempt_id INTEGER NOT NULL,
+    time REAL NOT NULL,
+    covers_from INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_game_category ON files (game_name, category_name);
+CREATE INDEX IF NOT EXISTS attempts_started ON attempts (started);
+CREATE INDEX IF NOT EXISTS segments_name ON segments (name);
+CREATE INDEX IF NOT EXISTS segment_times_segment ON segment_times (file_id, segment_index, attempt_id);
+CREATE INDEX IF NOT EXISTS segment_times_attempt ON segment_times (file_id, attempt_id);
+'''
+
+# opens (creating if needed) the database at database_path
+def open_database(database_path):
+    connection = sqlite3.connect(database_path)
+    connection.execute('PRAGMA foreign_keys = ON')
+
+    # a write-ahead log makes the large ingest transactions much cheaper
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+# formats a datetime the way it's stored, None stays None
+def format_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value is not None else None
+
+# stores one lss() in the database, replacing anything stored for path before.
+# returns False without writing anything if path was already stored with the same file_hash
+def ingest_lss(connection, split_data, path, file_hash):
+    path = os.path.abspath(path)
+    row = connection.execute('SELECT file_hash FROM files WHERE path = ?', (path,)).fetchone()
+    if row is not None and row[0] == file_hash:
+        return False
+
+    with connection:
+        connection.execute('DELETE FROM files WHERE path = ?', (path,))
+        file_id = connection.execute(
+            'INSERT INTO files (path, file_hash, game_name, category_name, runs_started, runs_finished, sob, total_runtime, total_playtime) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, file_hash, split_data.game_name, split_data.category_name, split_data.runs_started, split_data.runs_finished,
+             split_data.sob, split_data.total_runtime, split_data.total_playtime)).lastrowid
+
+        connection.executemany('INSERT INTO attempts VALUES (?, ?, ?, ?, ?)',
+                               ((file_id, attempt.id, format_datetime(attempt.started), format_datetime(attempt.ended), attempt.real_time)
+                                for attempt in split_data.attempts.values()))
+
+        connection.executemany('INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               ((file_id, index, segment.name, segment.split_time_pb, segment.segment_pb, segment.segment_gold.time,
+                                 segment.segment_gold.id, segment.summary.worst, segment.segment_worst.id, segment.summary.average,
+                                 segment.summary.median, segment.summary.stdev, segment.finished_rate, segment.summary.decent_rate)
+                                for index, segment in enumerate(split_data.segments)))
+
+        for index, segment in enumerate(split_data.segments):
+            history, skipped = segment.segment_history, segment.skipped_history
+            connection.executemany('INSERT INTO segment_times VALUES (?, ?, ?, ?, NULL)',
+                                   zip([file_id] * len(history), [index] * len(history), history.ids.tolist(), history.times.tolist()))
+            connection.executemany('INSERT INTO segment_times VALUES (?, ?, ?, ?, ?)',
+                                   zip([file_id] * len(skipped), [index] * len(skipped), skipped.ids.tolist(), skipped.times.tolist(), segment.skipped_from.tolist()))
+    return True
+
+# stores every (lss_file, folder_path) that has been processed, reading each one from its cache
+# (see lssCache.py) so nothing is parsed again. returns how many files were added or updated
+def ingest_lss_files(database_path, processed_files):
+    connection = open_database(database_path)
+    ingested = 0
+    try:
+        for lss_file, folder_path in processed_files:
+            cache = load_cache(get_cache_path(lss_file, folder_path))
+            if cache is None:
+                print('No cache to add to the database for', lss_file)
+                continue
+            ingested += ingest_lss(connection, cache.split_file, lss_file, cache.file_hash)
+    finally:
+        connection.close()
+
+    log(f'Successfully added {ingested} file(s) to {database_path}')
+    return ingested
+
+# filters on files.game_name/category_name (None for any), as a WHERE clause and its parameters
+def get_file_filter(game_name=None, category_name=None):
+    conditions, parameters = ['1'], []
+    if game_name is not None:
+        conditions.append('files.game_name = ?')
+        parameters.append(game_name)
+    if category_name is not None:
+        conditions.append('files.category_name = ?')
+        parameters.append(category_name)
+    return ' AND '.join(conditions), parameters
+
+# every time a segment's gold was improved, in order of when the attempt started:
+# (game, category, path, segment index, segment name, attempt id, started, time, previous gold).
+# times that include skipped splits aren't golds
+def get_gold_progression(connection, game_name=None, category_name=None, segment_name=None):
+    where, parameters = get_file_filter(game_name, category_name)
+    if segment_name is not None:
+        where += ' AND segments.name = ?'
+        parameters.append(segment_name)
+
+    return connection.execute(f'''
+        WITH ordered AS (
+            SELECT segment_times.file_id, segment_times.segment_index, segment_times.attempt_id, attempts.started, segment_times.time,
+                   MIN(segment_times.time) OVER (PARTITION BY segment_times.file_id, segment_times.segment_index
+                                                 ORDER BY attempts.started, segment_times.attempt_id
+                                                 ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS previous_gold
+            FROM segment_times
+            JOIN files ON files.id = segment_times.file_id
+            JOIN segments ON segments.file_id = segment_times.file_id AND segments.segment_index = segment_times.segment_index
+            LEFT JOIN attempts ON attempts.file_id = segment_times.file_id AND attempts.attempt_id = segment_times.attempt_id
+            WHERE segment_times.covers_from IS NULL AND {where}
+        )
+        SELECT files.game_name, files.category_name, files.path, ordered.segment_index, segments.name,
+               ordered.attempt_id, ordered.started, ordered.time, ordered.previous_gold
+        FROM ordered
+        JOIN files ON files.id = ordered.file_id
+        JOIN segments ON segments.file_id = ordered.file_id AND segments.segment_index = ordered.segment_index
+        WHERE ordered.previous_gold IS NULL OR ordered.time < ordered.previous_gold
+        ORDER BY files.game_name, files.category_name, files.path, ordered.segment_index, ordered.started, ordered.attempt_id
+    ''', parameters).fetchall()
+
+# how often runs reset in each segment, grouped by game, category and segment:
+# (game, category, segment index, segment name, attempts that reached it, resets in it, reset rate in percent).
+# an unfinished attempt reset in the segment after the last one it has a time in (including times over skipped splits)
+def get_reset_rates(connection, game_name=None, category_name=None):
+    where, parameters = get_file_filter(game_name, category_name)
+
+    return connection.execute(f'''
+        WITH reached AS (
+            SELECT attempts.file_id, attempts.real_time IS NOT NULL AS finished,
+                   COALESCE(MAX(segment_times.segment_index), -1) + 1 AS reset_index
+            FROM attempts
+            JOIN files ON files.id = attempts.file_id
+            LEFT JOIN segment_times ON segment_times.file_id = attempts.file_id AND segment_times.attempt_id = attempts.attempt_id
+            WHERE {where}
+            GROUP BY attempts.file_id, attempts.attempt_id
+        ),
+        stopped AS (
+            SELECT file_id, reset_index, COUNT(*) AS stopped_count, SUM(NOT finished) AS reset_count
+            FROM reached
+            GROUP BY file_id, reset_index
+        ),
+        per_segment AS (
+            -- every attempt reached a segment unless it stopped in an earlier one
+            SELECT segments.file_id, segments.segment_index, segments.name,
+                   files.runs_started - COALESCE(SUM(stopped.stopped_count) OVER (PARTITION BY segments.file_id ORDER BY segments.segment_index
+                                                                                 ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS reached_count,
+                   COALESCE(stopped.reset_count, 0) AS reset_count
+            FROM segments
+            JOIN files ON files.id = segments.file_id
+            LEFT JOIN stopped ON stopped.file_id = segments.file_id AND stopped.reset_index = segments.segment_index
+            WHERE {where}
+        )
+        SELECT files.game_name, files.category_name, per_segment.segment_index, per_segment.name,
+               SUM(per_segment.reached_count), SUM(per_segment.reset_count),
+               100.0 * SUM(per_segment.reset_count) / NULLIF(SUM(per_segment.reached_count), 0)
+        FROM per_segment
+        JOIN files ON files.id = per_segment.file_id
+        GROUP BY files.game_name, files.category_name, per_segment.segment_index, per_segment.name
+        ORDER BY files.game_name, files.category_name, per_segment.segment_index
+    ''', parameters + parameters).fetchall()
+
+# prints a query's results as CSV, e.g.
+# python lssDatabase.py stats.db golds --game "Super Mario 64" --category "16 Star"
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query a database filled with liveSplitStats.py --database.')
+    parser.add_argument('database', help='the SQLite database')
+    parser.add_argument('query', choices=['golds', 'resets'], help='golds: every gold improvement, resets: reset rate by segment')
+    parser.add_argument('--game', help='only files for this game')
+    parser.add_argument('--category', help='only files for this category')
+    parser.add_argument('--segment', help='only this segment (golds only)')
+    args = parser.parse_args(argv)
+
+    connection = open_database(args.database)
+    try:
+        writer = csv.writer(sys.stdout)
+        if args.query == 'golds':
+            writer.writerow(['game', 'category', 'file', 'segment index', 'segment', 'attempt', 'started', 'time', 'previous gold'])
+            writer.writerows(get_gold_progression(connection, args.game, args.category, args.segment))
+        else:
+            writer.writerow(['game', 'category', 'segment index', 'segment', 'reached', 'resets', 'reset rate'])
+            writer.writerows(get_reset_rates(connection, args.game, args.category))
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,63 +1,208 @@
 # Dependencies
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MaxNLocator
 import numpy as np
 
 # Imports
-from datetime import timedelta, datetime
-from lssHelper import get_weighted_average_time, time_to_seconds
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import os
+from lssHelper import TIMING_METHOD_NAMES
 import re
 
 # Locals
-from lssParser import time_to_seconds, seconds_to_time
+from lss import rolling_stats
+from lssMatrix import build_attempt_matrix, get_sum_of_best_timeline
 
 def clean_segment_name(segment):
     cleaned_name = re.sub(r'[\\/:"*?<>|]+', '', segment)
     return cleaned_name
 
-# creates graphs for each segment, showing their duration over time
-def get_segment_duration_graphs(split_data, folder_path):
-    graphs_segment_duration = {}
-    # Prepare graphs: segment duration over time
-    for current_segment in split_data.segments:
+# the grid layout puts this many segment duration graphs on each page
+GRID_ROWS = 5
+GRID_COLUMNS = 4
+
+# default number of points each line is reduced to (see downsample_series): about one per pixel across a
+# 1024 pixel wide graph, or across one of the 400 pixel wide graphs in the grid layout
+GRAPH_POINTS = 1000
+GRID_POINTS = 400
+
+# Largest-Triangle-Three-Buckets: picks target points of a series (x in increasing order) that keep its visual
+# shape. the first and last points are always picked, the rest are split into target - 2 buckets and from each
+# the point forming the largest triangle with the point picked before it and the average of the next bucket is picked.
+# returns the indexes of the picked points in order, every index if there are target points or fewer
+def get_lttb_indexes(x, y, target):
+    count = len(x)
+    if count <= target or target < 3:
+        return np.arange(count)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    buckets = target - 2
+    edges = np.linspace(1, count - 1, buckets + 1).astype(np.int64)
+    sizes = np.diff(edges)
+
+    # the third point of each bucket's triangles: the next bucket's average, the last point for the last bucket
+    next_x = np.append(np.add.reduceat(x[:count - 1], edges[:-1])[1:] / sizes[1:], x[-1])
+    next_y = np.append(np.add.reduceat(y[:count - 1], edges[:-1])[1:] / sizes[1:], y[-1])
+
+    picked = np.empty(target, dtype=np.int64)
+    picked[0], picked[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(buckets):
+        start, end = edges[bucket], edges[bucket + 1]
+        previous_x, previous_y = x[previous], y[previous]
+        # twice the triangle areas, only the largest matters
+        areas = np.abs((previous_x - next_x[bucket]) * (y[start:end] - previous_y) - (previous_x - x[start:end]) * (next_y[bucket] - previous_y))
+        previous = start + int(np.argmax(areas))
+        picked[bucket + 1] = previous
+    return picked
+
+# reduces a series of attempt ids and times to about max_points points with get_lttb_indexes, making sure the
+# lowest time (gold), the highest time (worst) and the times of keep_ids (e.g. the PB attempt) are still there
+def downsample_series(ids, times, max_points, keep_ids=()):
+    ids = np.asarray(ids)
+    times = np.asarray(times)
+    if len(times) <= max_points:
+        return ids, times
+
+    keep = [get_lttb_indexes(ids, times, max_points), [np.argmin(times), np.argmax(times)], np.flatnonzero(np.isin(ids, [attempt_id for attempt_id in keep_ids if attempt_id is not None]))]
+    keep = np.unique(np.concatenate(keep).astype(np.int64))
+    return ids[keep], times[keep]
+
+# the attempt id of the fastest finished run, None if no run was finished
+def get_pb_attempt_id(split_data):
+    if not split_data.finished_run_times:
+        return None
+    return min(split_data.finished_run_times, key=split_data.finished_run_times.get)
+
+# renders a single segment duration graph and saves it straight away.
+# uses a bare Figure (Agg canvas) rather than pyplot so nothing is kept alive
+# after saving and it can run headless in worker processes.
+# rolling is a rolling_stats() at the same attempts, drawn over the times as the rolling median with its
+# interquartile range shaded, and the rolling standard deviation against its own axis on the right
+def save_segment_duration_graph(segment_name, segment_id, segment_times, filename, rolling=None):
+    figure = Figure(figsize=(10.67, 8))  # roughly 1024x768 at 96 dpi
+    axes = figure.add_subplot()
+    axes.plot(segment_id, segment_times, label='Segment Time')
+    axes.set_title(segment_name)
+    axes.set_xlabel('Run')
+    axes.set_ylabel('Segment Time')
+    
+    # show segment times as timedelta
+    time_formatter = FuncFormatter(lambda x, _: str(timedelta(seconds=x)))
+    axes.yaxis.set_major_locator(MaxNLocator(integer=True))
+    axes.yaxis.set_major_formatter(time_formatter)
+    
+    if rolling is not None and len(rolling.ids) > 0:
+        axes.fill_between(rolling.ids, rolling.q1, rolling.q3, color='tab:orange', alpha=0.25, linewidth=0, label=f'Rolling IQR (last {rolling.window})')
+        axes.plot(rolling.ids, rolling.median, color='tab:orange', label=f'Rolling Median (last {rolling.window})')
+        std_dev_axes = axes.twinx()
+        std_dev_axes.plot(rolling.ids, rolling.stdev, color='tab:green', linewidth=0.8, linestyle='--', label=f'Rolling Std Dev (last {rolling.window})')
+        std_dev_axes.set_ylabel('Standard Deviation')
+        std_dev_axes.yaxis.set_major_formatter(time_formatter)
+        std_dev_axes.set_ylim(bottom=0)
+        lines, labels = axes.get_legend_handles_labels()
+        std_dev_lines, std_dev_labels = std_dev_axes.get_legend_handles_labels()
+        axes.legend(lines + std_dev_lines, labels + std_dev_labels, loc='upper right')
+    
+    figure.savefig(filename)
+    return filename
+
+# a rolling_stats() (see get_rolling_stats) at the attempts in ids only
+def get_rolling_stats_at(rolling, ids):
+    keep = np.isin(rolling.ids, ids)
+    return rolling_stats(rolling.window, rolling.ids[keep], rolling.q1[keep], rolling.median[keep], rolling.q3[keep], rolling.stdev[keep])
+
+# creates graphs for each segment, showing their duration over time.
+# each figure is saved as soon as it's rendered so only one is open per process,
+# with workers > 1 the figures are spread across that many processes. each history is downsampled to max_points points first.
+# rolling ({segment index: rolling_stats()} of the whole histories) is drawn over them at the same points, None for no overlay.
+# segment_indexes limits which segments are drawn (default all). returns the filenames of the saved graphs
+def get_segment_duration_graphs(split_data, folder_path, workers=1, segment_indexes=None, max_points=GRAPH_POINTS, rolling=None):
+    pb_ids = [get_pb_attempt_id(split_data)]
+    graph_args = []
+    for index, current_segment in enumerate(split_data.segments):
+        if segment_indexes is not None and index not in segment_indexes:
+            continue
         if not current_segment.segment_history:
             continue
         
-        segment_times = [time_to_seconds(value) for value in current_segment.segment_history.values()]
-                
-        segment_id = [int(key) for key in current_segment.segment_history.keys()][:len(segment_times)]
-        
-        plt.rcParams['figure.figsize'] = (10.67, 8)  # roughly 1024x768 at 96 dpi
-        plt.figure()
-        plt.plot(segment_id, segment_times)
-        plt.title(current_segment.name)
-        plt.xlabel('Run')
-        plt.ylabel('Segment Time')
-        
-        # convert segment times to timedelta objects
-        segment_time_as_timedelta = [timedelta(seconds=time) for time in segment_times]
-        plt.gca().yaxis.set_major_locator(plt.MaxNLocator(integer=True))
-        plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: str(timedelta(seconds=x)))) 
-
-        # store current plot in the dictionary
-        title = f'Segment length over time for {current_segment.name}'
-        graphs_segment_duration[title] = plt.gcf()
-
+        cleaned_segment_name = clean_segment_name(current_segment.name)
+        filename = os.path.join(folder_path, f'graph_segment{index}_{cleaned_segment_name}.png')
+        segment_ids, segment_times = downsample_series(current_segment.segment_history.ids, current_segment.segment_history.times, max_points, pb_ids)
+        segment_rolling = get_rolling_stats_at(rolling[index], segment_ids) if rolling is not None else None
+        graph_args.append((current_segment.name, segment_ids, segment_times, filename, segment_rolling))
     
-    for index, (key, figure) in enumerate(graphs_segment_duration.items()):
-        segment_name = split_data.segments[index].name
-        cleaned_segment_name = clean_segment_name(segment_name)
-        filename = f'{folder_path}\\graph_segment{index}_{cleaned_segment_name}.png'
-        figure.savefig(filename)
-        plt.close(figure)
+    if workers <= 1 or len(graph_args) <= 1:
+        return [save_segment_duration_graph(*args) for args in graph_args]
     
-    return graphs_segment_duration
+    with ProcessPoolExecutor(max_workers=min(workers, len(graph_args))) as executor:
+        return list(executor.map(save_segment_duration_graph, *zip(*graph_args), chunksize=max(1, len(graph_args) // (4 * workers))))
+
+# renders one page of the grid layout: a GRID_ROWS x GRID_COLUMNS grid of segment duration graphs
+# sharing the run axis, segments is a list of (segment name, attempt ids, times), already downsampled
+def save_segment_grid_page(title, segments, filename):
+    figure = Figure(figsize=(GRID_COLUMNS * 4, GRID_ROWS * 3))  # roughly 400x300 per graph at 100 dpi
+    grid = figure.subplots(GRID_ROWS, GRID_COLUMNS, sharex=True, squeeze=False,
+                           gridspec_kw={'left': 0.07, 'right': 0.99, 'bottom': 0.05, 'top': 0.93, 'wspace': 0.3, 'hspace': 0.35}).flat
+    time_formatter = FuncFormatter(lambda x, _: str(timedelta(seconds=x)))
+
+    for index, (segment_name, segment_ids, segment_times) in enumerate(segments):
+        axes = grid[index]
+        axes.plot(segment_ids, segment_times, linewidth=0.8)
+        axes.set_title(segment_name, fontsize='small')
+        axes.yaxis.set_major_locator(MaxNLocator(nbins=5, integer=True))
+        axes.yaxis.set_major_formatter(time_formatter)
+        axes.tick_params(labelsize='x-small')
+
+        # the run axis is only labelled on the bottom row, which may be missing on the last page
+        if index + GRID_COLUMNS >= len(segments):
+            axes.tick_params(labelbottom=True)
+    for axes in grid[len(segments):]:
+        axes.set_axis_off()
+
+    figure.suptitle(title)
+    figure.supxlabel('Run')
+    figure.supylabel('Segment Time')
+    figure.savefig(filename)
+    return filename
+
+# alternative to get_segment_duration_graphs for long routes: segment duration graphs are drawn
+# GRID_ROWS * GRID_COLUMNS to a page as graph_segments_page<n>.png, each downsampled to max_points points,
+# so the number of figures saved grows with the number of pages instead of segments.
+# pages are spread across workers processes, segment_indexes limits which pages are redrawn to the ones
+# holding those segments (default all). returns the filenames of the saved pages
+def get_segment_grid_graphs(split_data, folder_path, workers=1, segment_indexes=None, max_points=GRID_POINTS):
+    page_size = GRID_ROWS * GRID_COLUMNS
+    segments = split_data.segments
+    page_count = (len(segments) + page_size - 1) // page_size
+    pages = range(page_count) if segment_indexes is None else sorted({index // page_size for index in segment_indexes})
+
+    pb_ids = [get_pb_attempt_id(split_data)]
+    page_args = []
+    for page in pages:
+        page_segments = []
+        for index in range(page * page_size, min((page + 1) * page_size, len(segments))):
+            history = segments[index].segment_history
+            page_segments.append((f'{index + 1}. {segments[index].name}', *downsample_series(history.ids, history.times, max_points, pb_ids)))
+
+        title = f'Segment Duration Over Time ({page + 1}/{page_count})'
+        page_args.append((title, page_segments, os.path.join(folder_path, f'graph_segments_page{page + 1}.png')))
+
+    if workers <= 1 or len(page_args) <= 1:
+        return [save_segment_grid_page(*args) for args in page_args]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(page_args))) as executor:
+        return list(executor.map(save_segment_grid_page, *zip(*page_args)))
 
 # creates 4 graphs:
 # * Bar graph: standard deviation for each segment
 # * Bar graph: percentage of above average segments
 # * Bar graph: possible time save in PB
-# * Line graph: Run duration over time
-def get_graphs(split_data, segment_names, folder_path):
+# * Line graph: Run duration over time (downsampled to max_points points) with the sum of best after each attempt
+def get_graphs(split_data, segment_names, folder_path, max_points=GRAPH_POINTS):
     graphs = []
     names = ['stdev', 'decent_segs', 'possible_time_save', 'runs_over_time']
     #output all graphs to folder_path
@@ -68,19 +213,17 @@ def get_graphs(split_data, segment_names, folder_path):
     
     for _ in range(1):
         for current_segment in split_data.segments:
-            if not current_segment.segment_history:
-                continue
-            
-            std_dev_values.append(time_to_seconds(current_segment.stats.stdev))
-            segment_times_as_timedelta.append(timedelta(seconds=time_to_seconds(current_segment.stats.stdev)))
+            # a segment that was never run (e.g. a newly added split) still gets its place on the axis
+            stdev = current_segment.summary.stdev if current_segment.summary.stdev is not None else 0.0
+            std_dev_values.append(stdev)
+            segment_times_as_timedelta.append(timedelta(seconds=stdev))
         
         # make bar graph
-        plt.figure()
+        plt.figure(figsize=(10.67, 8)) # roughly 1024x768 at 96 dpi
         plt.bar(segment_names, std_dev_values, color='blue')
         plt.title('Standard Deviation for Each Segment')
         plt.xlabel('Segment')
         plt.ylabel('Standard Deviation')
-        plt.rcParams['figure.figsize'] = (10.67, 8) # roughly 1024x768 at 96 dpi
             
         # convert y-axis to timedelta
         plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: str(timedelta(seconds=x))))
@@ -92,15 +235,14 @@ def get_graphs(split_data, segment_names, folder_path):
         graphs.append(plt.gcf())
     
     # Prepare graph: percentage of decent segments (within x% of gold)
-    above_average_percentages = [float(segment.stats.decent_rate.rstrip('%')) for segment in split_data.segments]
+    above_average_percentages = [segment.summary.decent_rate or 0.0 for segment in split_data.segments]
     
     for _ in range(1):
-        plt.figure()
+        plt.figure(figsize=(10.67, 8)) # roughly 1024x768 at 96 dpi
         plt.bar(segment_names, above_average_percentages, color='green')
         plt.title('Decent Segments - Within 3% of Gold')
         plt.xlabel('Segment')
         plt.ylabel('Percent')
-        plt.rcParams['figure.figsize'] = (10.67, 8) # roughly 1024x768 at 96 dpi
         
         for i, percentage in enumerate(above_average_percentages):
             plt.text(i, percentage+1, f'{percentage:.2f}', ha='center')
@@ -113,17 +255,15 @@ def get_graphs(split_data, segment_names, folder_path):
 
     # Prepare graph: possible time save in PB
     for _ in range(1):
-        possible_time_saves = [segment.possible_time_save for segment in split_data.segments]
-        possible_time_saves_seconds = [time_to_seconds(time) for time in possible_time_saves]
+        possible_time_saves_seconds = [segment.possible_time_save for segment in split_data.segments]
         possible_time_saves_timedelta = [timedelta(seconds=time) for time in possible_time_saves_seconds]
 
         # Create the bar graph
-        plt.figure()
+        plt.figure(figsize=(10.67, 8)) # roughly 1024x768 at 96 dpi
         plt.bar(segment_names, possible_time_saves_seconds, color='blue')
         plt.title('Possible Time Save in PB')
         plt.xlabel('Segment')
         plt.ylabel('Possible Time Save')
-        plt.rcParams['figure.figsize'] = (10.67, 8) # roughly 1024x768 at 96 dpi
 
         plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: str(timedelta(seconds=x))))
 
@@ -134,19 +274,26 @@ def get_graphs(split_data, segment_names, folder_path):
         
     # Prepare graph: run duration over time
     for _ in range(1):
-        run_ids = [int(key) for key in split_data.finished_run_times.keys()]
-        run_times = [time_to_seconds(value) for value in split_data.finished_run_times.values()]
+        run_ids = np.array(list(split_data.finished_run_times.keys()), dtype=np.int64)
+        run_times = np.array(list(split_data.finished_run_times.values()), dtype=np.float64)
+        run_ids, run_times = downsample_series(run_ids, run_times, max_points)
         
         #real_time_seconds = [time_to_seconds(rt) for rt in split_data.finished_run_times.values()]
         #real_time_timedeltas = [timedelta(seconds=seconds) for seconds in real_time_seconds]
         #run_ids = list(split_data.finished_run_times.keys())
         
         # Create the graph
-        plt.figure()
-        plt.plot(run_ids, run_times, marker='o')
+        plt.figure(figsize=(10.67, 8)) # roughly 1024x768 at 96 dpi
+        plt.plot(run_ids, run_times, marker='o', label='Finished runs')
+        
+        # the sum of best only ever goes down, so it's drawn as steps through the attempts that improved it
+        sob_ids, sob_times = get_sum_of_best_timeline(build_attempt_matrix(split_data, include_skipped=False))
+        if len(sob_ids) > 0:
+            improved = np.concatenate(([True], np.diff(sob_times) < 0))
+            plt.step(np.append(sob_ids[improved], sob_ids[-1]), np.append(sob_times[improved], sob_times[-1]), where='post', color='gold', label='Sum of best')
+        plt.legend()
         plt.title('Run Duration Over Time')
-        plt.ylabel('Real Time')
-        plt.rcParams['figure.figsize'] = (10.67, 8) # roughly 1024x768 at 96 dpi
+        plt.ylabel(TIMING_METHOD_NAMES[split_data.timing_method])
         
         run_time_as_timedelta = [timedelta(seconds=time) for time in run_times]
         plt.gca().yaxis.set_major_locator(plt.MaxNLocator(integer=True))
@@ -159,7 +306,7 @@ def get_graphs(split_data, segment_names, folder_path):
     
     index = 0
     for graph in graphs:
-        filename = f'{folder_path}\\graph_{names[index]}.png'
+        filename = os.path.join(folder_path, f'graph_{names[index]}.png')
         graph.savefig(filename)
         index += 1
         plt.close(graph)
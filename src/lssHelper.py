@@ -1,25 +1,82 @@
 # Imports
+import bisect
 import xml.etree.ElementTree as ET
 from datetime import datetime
 from datetime import timedelta
-from math import sqrt
 
 # Dependencies
 import numpy as np
 
-# convert <SegmentHistory> into a dictionary with values <time id="number"> and <RealTime>
-def make_dictionary(segment_history_element):
-    time_dict = {}
-    
-    # Iterate through the Time elements in the SegmentHistory
-    for time_element in segment_history_element.findall("Time"):
-        time_id = int(time_element.get("id"))  # Get the value of the id attribute
-        real_time = get_real_time(time_element)  # Assuming you have a function to get RealTime
-        
-        # Add the entry to the dictionary
-        time_dict[time_id] = real_time
-    
-    return time_dict
+# Locals
+from lss import time_history, segment_summary, running_stats, rolling_stats
+
+# progress messages go through log() so they can be silenced with set_quiet(True), errors are always printed
+quiet = False
+
+def set_quiet(enabled):
+    global quiet
+    quiet = enabled
+
+def is_quiet():
+    return quiet
+
+def log(*args):
+    if not quiet:
+        print(*args)
+
+# timing methods LiveSplit can record, every time in a .lss file can have either or both.
+# each gets its own lss() (see get_timings), RealTime is the default everywhere
+TIMING_METHODS = ('RealTime', 'GameTime')
+TIMING_METHOD_NAMES = {'RealTime': 'Real Time', 'GameTime': 'Game Time'}
+
+# convert <SegmentHistory> into a time_history() for each timing method of <time id="number">
+# and its <RealTime>/<GameTime> in seconds, times without that timing method are left out
+def make_time_histories(segment_history_element):
+    time_elements = segment_history_element.findall("Time")
+    
+    time_ids = np.array([time_element.get("id") for time_element in time_elements], dtype=np.int32)
+    return get_time_histories(time_ids, time_elements)
+
+# convert <SegmentHistory> into a time_history() of <time id="number"> and <RealTime> in seconds,
+# times without a <RealTime> component are left out
+def make_time_history(segment_history_element):
+    return make_time_histories(segment_history_element)['RealTime']
+
+# like make_time_histories but only parses the times with an id above high_water_mark,
+# also returns how many <Time> elements are at or below high_water_mark and how many there are in total
+def make_time_histories_after(segment_history_element, high_water_mark):
+    time_elements = segment_history_element.findall("Time")
+    
+    time_ids = np.array([time_element.get("id") for time_element in time_elements], dtype=np.int32)
+    is_new = time_ids > high_water_mark
+    new_elements = [time_element for time_element, new in zip(time_elements, is_new) if new]
+    
+    return get_time_histories(time_ids[is_new], new_elements), len(time_elements) - len(new_elements), len(time_elements)
+
+# reads every timing method of the given <Time> elements in a single pass over them,
+# returns {timing method: time_history()} leaving out the times that don't have that method
+def get_time_histories(time_ids, time_elements):
+    time_strs = {timing_method: [] for timing_method in TIMING_METHODS}
+    for time_element in time_elements:
+        for timing_method, time_str in get_times(time_element).items():
+            time_strs[timing_method].append(time_str)
+    
+    histories = {}
+    for timing_method, strs in time_strs.items():
+        # most files only use one timing method, skip converting a column that's all missing
+        if not any(strs):
+            histories[timing_method] = time_history()
+            continue
+        seconds = times_to_seconds(strs)
+        has_time = ~np.isnan(seconds)
+        histories[timing_method] = time_history(time_ids[has_time], seconds[has_time])
+    return histories
+
+# lowest attempt id under <SegmentHistory>, including skipped splits (<Time> without a <RealTime>),
+# or None if it has no attempts
+def get_oldest_attempt_id(segment_history_element):
+    time_ids = [int(time_element.get("id")) for time_element in segment_history_element.iter("Time")]
+    return min((time_id for time_id in time_ids if time_id > 0), default=None)
 
 # retrieves <RealTime> under element
 def get_real_time(element):
@@ -29,249 +86,156 @@ def get_real_time(element):
     else:
         return real_time_element.text
 
+# retrieves every timing method under element (None for none) in one pass over its children,
+# as {timing method: text}, '' for the ones that are missing
+def get_times(element):
+    times = dict.fromkeys(TIMING_METHODS, '')
+    if element is not None:
+        for child in element:
+            if child.tag in times:
+                times[child.tag] = child.text or ''
+    return times
+
+# parses the started/ended attributes of an <Attempt>, returns None if missing
+def get_attempt_datetime(attempt, attribute):
+    value = attempt.get(attribute)
+    if value is None:
+        return None
+    return datetime.strptime(value, '%m/%d/%Y %H:%M:%S')
+
 # retrieves the total number of attempts that have been finished (those with a <RealTime> element)
-def count_runs_finished(root):
-    attempts = root.findall(".//AttemptHistory/Attempt[RealTime]")
-    return len(attempts)
+def count_runs_finished(attempts):
+    return sum(1 for attempt in attempts.values() if attempt.real_time is not None)
 
 # retrieves the total number of attempts 
-def count_attempts(root):
-    attempts = root.findall(".//AttemptHistory/Attempt")
+def count_attempts(attempts):
     return len(attempts)
 
-# find the attempt that matches a given time (used for golds/worst segments currently)
-def get_attempt_date(attempt_id, root):
-    # find attempt with matching ID
-    attempt_element = root.find(f"./AttemptHistory/Attempt[@id='{attempt_id}']")
-    
-    # extract the started="" attribute
-    if attempt_element is not None:
-        result = attempt_element.get('started')
-        result = result.split(' ')
-        return result
-    else:
-        return ''
+# find the datetime that a given attempt was started (used for golds/worst segments currently), None if unknown
+# attempts is the attempt id -> attempt_data() index built while reading <AttemptHistory>
+def get_attempt_started(attempt_id, attempts):
+    attempt = attempts.get(attempt_id)
+    return attempt.started if attempt is not None else None
 
 # retrieves <SplitTimes><SplitTime name="Personal Best">
 def get_splittime_pb(element, name):
-    split_time = element.find(f"SplitTime[@name='{name}']")
-    if split_time is not None:
-        real_time_element = split_time.find('RealTime')
-        return real_time_element.text if real_time_element is not None else ''
-    return ''
+    return get_splittimes_pb(element, name)['RealTime']
+
+# retrieves <SplitTimes><SplitTime name="Personal Best"> for every timing method, see get_times
+def get_splittimes_pb(element, name):
+    if element is None:
+        return get_times(None)
+    return get_times(element.find(f"SplitTime[@name='{name}']"))
 
 # sum of end-start times in <AttemptHistory>. Format:
 # <Attempt id="1" started="09/15/2022 03:47:14" isStartedSynced="True" ended="09/15/2022 04:16:08" isEndedSynced="True" />
-def get_total_playtime(attempt_history):
-    attempts = attempt_history.findall('Attempt')
-    
+def get_total_playtime(attempts):
     total_time = 0
     
-    for attempt in attempts:
-        started = attempt.get('started')
-        ended = attempt.get('ended')
-        
-        started_datetime = datetime.strptime(started, '%m/%d/%Y %H:%M:%S')
-        ended_datetime = datetime.strptime(ended, '%m/%d/%Y %H:%M:%S')
+    for attempt in attempts.values():
+        # attempts imported from other timers may be missing a start or end
+        if attempt.started is None or attempt.ended is None:
+            continue
         
-        delta = ended_datetime - started_datetime
+        delta = attempt.ended - attempt.started
         time_seconds = delta.total_seconds()
         
         total_time += time_seconds
         
-    return seconds_to_playtime(total_time)
+    return total_time
+
+# the run time of an attempt_data() in timing_method, None if it wasn't finished (or timed with it)
+def get_attempt_time(attempt, timing_method='RealTime'):
+    return attempt.game_time if timing_method == 'GameTime' else attempt.real_time
 
 # get time and ID for all finished runs
-def get_finished_runs(attempt_history):
+def get_finished_runs(attempts, timing_method='RealTime'):
     finished_runs = {}
     
-    for attempt in attempt_history:
-        attempt_id = attempt.get('id')
-        real_time = get_real_time(attempt)
-        
-        if real_time != '':
-            finished_runs[attempt_id] = real_time
+    for attempt_id, attempt in attempts.items():
+        run_time = get_attempt_time(attempt, timing_method)
+        if run_time is not None:
+            finished_runs[attempt_id] = run_time
             
     return finished_runs
 
+# the lss() for each timing method the file was read with, {timing method: lss()}.
+# a timing method without any times in the file is left out
+def get_timings(split_file):
+    timings = {'RealTime': split_file}
+    if split_file.game_time is not None and has_times(split_file.game_time):
+        timings['GameTime'] = split_file.game_time
+    return timings
+
+# whether an lss() has any times at all: finished runs, PB splits, golds or segment history
+def has_times(split_file):
+    return bool(split_file.finished_run_times) or any(
+        len(segment.raw_history) > 0 or segment.segment_gold.time is not None or segment.split_time_pb is not None
+        for segment in split_file.segments)
+
 #-----------------------------------
 # <SegmentHistory> utility functions
+# all of these take a time_history(), times are in seconds
 #-----------------------------------
 
-# retrieves the first number from <Time id="number"> where <RealTime> matches gold_time
-def get_gold_id(segment_history, gold_time):
-    for time_id, real_time in segment_history.items():
-        if real_time == gold_time:
-            return time_id
-    
-    return ''
-
-# retrieves the number from <Time id="number"> where <RealTime> is largest, also returns <RealTime>
-def get_worst_time(segment_history):
-    worst_time = '00:00:00'
-    worst_time_id = ''
-    
-    for time_id, real_time in segment_history.items():
-        if real_time > worst_time:
-            worst_time = real_time
-            worst_time_id = time_id
-                
-    return [worst_time_id, worst_time]
-
-# retrieves the number from <Time id="number"> where <RealTime> is smallest, also returns <RealTime>
-def get_best_time(segment_history):
-    best_time = '99:99:99'
-    best_time_id = ''
-    
-    for time_id, real_time in segment_history.items():
-        if real_time > best_time:
-            best_time = real_time
-            best_time_id = time_id
-                
-    return [best_time_id, best_time]
-
 # calculate the average time of a segment
-def get_average_time(segment_history):       
-    total = 0.0
-    count = 0   # could just use len() but meh
-    
-    for real_time in segment_history.values():
-        if real_time:
-            total += time_to_seconds(real_time)
-            count += 1
-    
-    if count == 0:
+def get_average_time(segment_history):
+    if len(segment_history) == 0:
         return ''
     
-    average_in_seconds = total / count
-    return seconds_to_time(average_in_seconds)
+    return seconds_to_time(np.mean(segment_history.times))
 
 # calculate the median time for a segment
 def get_median_time(segment_history):
-    time_list = []
-
-    for real_time in segment_history.values():
-        if real_time:
-            time_list.append(time_to_seconds(real_time))
-    if not time_list:
+    if len(segment_history) == 0:
         return ''
 
-    time_list.sort()
-    n = len(time_list)
-
-    # even number of times
-    if n % 2 == 0:
-        middle1 = time_list[n // 2 - 1]
-        middle2 = time_list[n // 2]
-        median_in_seconds = (middle1 + middle2) / 2
-    # odd number of times
-    else:
-        median_in_seconds = time_list[n // 2]
-
-    return seconds_to_time(median_in_seconds)
+    return seconds_to_time(np.median(segment_history.times))
 
 # calculate standard deviation for a segment
 def get_std_dev(segment_history):
-    # get all times in seconds for ease of maths
-    times_in_seconds = [time_to_seconds(real_time) for real_time in segment_history.values()]
-    
-    # get the average
-    mean_time = sum(times_in_seconds) / len(times_in_seconds)
-    
-    # get squared deltas from mean
-    squared_deltas = [(time - mean_time) ** 2 for time in times_in_seconds]
-    
-    # get mean of squared deltas
-    variance = sum(squared_deltas) / len(squared_deltas)
-    
-    # take the square root to get std dev
-    std_dev_seconds = sqrt(variance)
-    
-    return seconds_to_time(std_dev_seconds)
+    return seconds_to_time(np.std(segment_history.times))
 
-# % of the time a segment was finished vs. total attempts
+# % of the time a segment was finished vs. total attempts, None if it never was
 def get_percent_finished(attempts, segment_history):
     completed_segments = len(segment_history)
     if completed_segments == 0:
-        return '? %'
-    finished_percent = (completed_segments/attempts)*100
-    return '{:.2f}%'.format(finished_percent)
-
-# count number of splits within 3% of gold
-def get_above_average_rate(segment_history, gold):
-    if segment_history is None:
-        return 0
-    
-    segment_times = [time_to_seconds(real_time) for real_time in segment_history.values()]
-    gold_time = time_to_seconds(gold)
-    
-    if not segment_times:
-        return 0
-    
-    decent_threshold = 0.03 * gold_time
-    
-    decent_count = sum(time - decent_threshold <= gold_time for time in segment_times)
-    segment_count = len(segment_times)
-    
-    decent_rate = (decent_count / segment_count) * 100
-    
-        
-    # average_time_seconds = time_to_seconds(get_weighted_average_time(segment_history))
-    # if not average_time_seconds:
-    #     return 0
-    
-    # above_average_count = 0
-    
-    # for real_time in segment_history.values():
-    #     real_time_seconds = time_to_seconds(real_time)
-    #     if real_time_seconds < average_time_seconds:
-    #         above_average_count += 1
-    
-    # segment_count = len(segment_history)
-    
-    # decent = (above_average_count / segment_count)*100
-    
-    return '{:.2f}%'.format(decent_rate)
-
-# return total time spend on a given segment
-def get_segment_sum(segment_history):
-    total = 0.0
-    
-    for time_id, real_time in segment_history.items():
-        real_time_seconds = time_to_seconds(real_time)
-        total += real_time_seconds
-
-    return total
-
-def get_inflated_time_ids(previous_segment_history, segment_history):
-    inflated_time_ids = []
+        return None
+    return (completed_segments/attempts)*100
 
-    segment_times = [time_to_seconds(real_time) for real_time in segment_history.values()]
-    mean_time = get_weighted_average_time(segment_history)
-    std_dev = get_weighted_std_dev(segment_history)
-
-    # get z scores for each time
-    z_scores = [(time_to_seconds(real_time) - time_to_seconds(mean_time)) / time_to_seconds(std_dev) for real_time in segment_history.values()]
-
-    # set a threshold - 3?
-    threshold_score = 3.5
-    
-    # find inflated times based on z_score
-    for index, time_id in enumerate(segment_history.keys()):
-        if z_scores[index] > threshold_score:
-            inflated_time_ids.append(time_id)
+#-----------------------------------
+# Skipped splits
+#-----------------------------------
 
+# when a split is skipped, LiveSplit leaves the attempt out of that segment's history and the next
+# segment's time covers both. last_seen maps attempt id -> index of the last segment it had a time in
+# (-1 if none yet), updated as each segment is reconciled, so every time is only looked at once.
+# a time is combined if its attempt is missing from the previous segment, unless the attempt is older
+# than previous_oldest_id, the oldest attempt in the previous segment's history (history added later or cleaned up)
+# returns (history without combined times, combined times, index of the first segment each one covers, last_seen)
+def reconcile_skipped_splits(last_seen, index, previous_oldest_id, segment_history):
+    ids = segment_history.ids
+    
+    # ids <= 0 aren't attempts (manually added or imported times), they're never combined
+    is_attempt = ids > 0
+    highest_id = ids.max(initial=0)
+    if highest_id >= len(last_seen):
+        last_seen = np.concatenate((last_seen, np.full(max(highest_id + 1, 2 * len(last_seen)) - len(last_seen), -1, dtype=np.int32)))
+    
+    previous_index = np.where(is_attempt, last_seen[np.where(is_attempt, ids, 0)], index - 1)
+    combined = previous_index != index - 1
+    if index > 0 and previous_oldest_id is not None:
+        combined &= ids >= previous_oldest_id
+    else:
+        combined[:] = False
     
-    # previous_best_time_id, previous_best_time = get_best_time(previous_segment_history)
-    # current_best_time_id, current_best_time = get_best_time(segment_history)
-    
-    # inflated_threshold = time_to_seconds(previous_best_time) + time_to_seconds(current_best_time)
+    last_seen[ids[is_attempt]] = index
     
-    # for time_id, real_time in segment_history.items():
-    #     if time_to_seconds(real_time) > inflated_threshold:
-    #         inflated_time_ids.append(time_id)
-            
-    return inflated_time_ids
+    if not combined.any():
+        return segment_history, time_history(), np.empty(0, dtype=np.int32), last_seen
+    return (time_history(ids[~combined], segment_history.times[~combined]),
+            time_history(ids[combined], segment_history.times[combined]),
+            (previous_index[combined] + 1).astype(np.int32), last_seen)
 
 #-----------------------------------
 # Convert between RealTime and seconds
@@ -285,6 +249,16 @@ def time_to_seconds(time_str):
     hours, minutes, seconds = int(parts[0]), int(parts[1]), float(parts[2])
     return hours * 3600 + minutes * 60 + seconds
 
+# convert .lss <RealTime> to seconds, also accepts [-][d.]HH:MM:SS.fffffff like times_to_seconds.
+# returns None for an empty or missing time
+def realtime_to_seconds(time_str):
+    if not time_str:
+        return None
+    hours, minutes, seconds = time_str.lstrip('-').split(':')
+    days, _, hours = hours.rpartition('.')
+    total_seconds = int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return -total_seconds if time_str.startswith('-') else total_seconds
+
 # convert seconds to .lss <RealTime> format HH:MM:SS.ms
 def seconds_to_time(seconds):
     if seconds == 0:
@@ -295,6 +269,80 @@ def seconds_to_time(seconds):
         minutes, seconds = divmod(remainder, 60)
         return "{:02}:{:02}:{:05.2f}".format(hours, minutes, seconds + time_obj.microseconds / 1000000)
 
+# convert seconds to the full .lss <RealTime> format [-]HH:MM:SS.fffffff (used when writing times back out),
+# negative times (e.g. split times with a negative timer offset) get a leading - like LiveSplit writes them
+def seconds_to_realtime(seconds):
+    ticks = round(abs(seconds) * 10000000)
+    whole_seconds, fraction = divmod(ticks, 10000000)
+    hours, remainder = divmod(whole_seconds, 3600)
+    minutes, seconds_part = divmod(remainder, 60)
+    sign = '-' if seconds < 0 and ticks > 0 else ''
+    return f'{sign}{hours:02}:{minutes:02}:{seconds_part:02}.{fraction:07}'
+
+# LiveSplit writes times as HH:MM:SS.fffffff, 16 characters: where the separators go, and the
+# scale of each digit in ticks (10,000,000 per second)
+REALTIME_WIDTH = 16
+REALTIME_SEPARATORS = {2: ':', 5: ':', 8: '.'}
+REALTIME_DIGIT_TICKS = np.array([36000000000 * 10, 36000000000, 0, 600000000 * 10, 600000000, 0, 10000000 * 10, 10000000, 0,
+                                 1000000, 100000, 10000, 1000, 100, 10, 1], dtype=np.int64)
+
+# convert a whole sequence of .lss <RealTime> strings to seconds at once, empty or missing (None) times become NaN.
+# HH:MM:SS.fffffff times are parsed with array arithmetic on their characters, anything else
+# ([-][d.]HH:MM:SS with other fractions) falls back to realtime_to_seconds. both give exactly the same seconds
+def times_to_seconds(time_strs):
+    shape = np.shape(time_strs)
+    time_strs = np.asarray([time_str or '' for time_str in np.asarray(time_strs, dtype=object).ravel().tolist()], dtype=np.str_)
+    seconds = np.full(len(time_strs), np.nan)
+    if len(time_strs) == 0:
+        return seconds.reshape(shape)
+    
+    # one row of unicode code points per time, shorter strings are padded with 0
+    width = max(time_strs.dtype.itemsize // 4, REALTIME_WIDTH)
+    characters = time_strs.astype(f'U{width}').view(np.uint32).reshape(len(time_strs), width)
+    digits = characters[:, :REALTIME_WIDTH].astype(np.int64) - ord('0')
+    fixed_width = np.all((digits >= 0) & (digits <= 9) | (REALTIME_DIGIT_TICKS == 0), axis=1) & np.all(characters[:, REALTIME_WIDTH:] == 0, axis=1)
+    for position, separator in REALTIME_SEPARATORS.items():
+        fixed_width &= characters[:, position] == ord(separator)
+    
+    # whole minutes and hours as integers plus seconds as ticks / 10^7, the same float realtime_to_seconds gets
+    rows = digits[fixed_width]
+    whole_ticks = rows[:, :6] @ REALTIME_DIGIT_TICKS[:6]
+    second_ticks = rows[:, 6:] @ REALTIME_DIGIT_TICKS[6:]
+    seconds[fixed_width] = whole_ticks // 10000000 + second_ticks / 10000000
+    
+    for index in np.flatnonzero(~fixed_width & (time_strs != '')).tolist():
+        seconds[index] = realtime_to_seconds(str(time_strs[index]))
+    return seconds.reshape(shape)
+
+# vectorized seconds_to_realtime, NaN becomes an empty string. times under 100 hours are written digit by digit
+# with array arithmetic, the rest (and negative times) go through seconds_to_realtime
+def seconds_to_realtimes(seconds):
+    shape = np.shape(seconds)
+    seconds = np.asarray(seconds, dtype=np.float64).ravel()
+    missing = np.isnan(seconds)
+    ticks = np.round(np.where(missing, 0, seconds) * 10000000).astype(np.int64)
+    fixed_width = ~missing & (ticks >= 0) & (ticks < 100 * 36000000000)
+    
+    # the array has to be wide enough for the longest time written the slow way
+    others = np.flatnonzero(~missing & ~fixed_width).tolist()
+    other_times = [seconds_to_realtime(float(seconds[index])) for index in others]
+    formatted = np.full(len(seconds), '', dtype=f'U{max(map(len, other_times), default=REALTIME_WIDTH)}')
+    formatted[others] = other_times
+    
+    # split into hours, minutes, seconds and the fraction, then each of those into its digits
+    whole_seconds, fraction = np.divmod(ticks[fixed_width], 10000000)
+    hours, remainder = np.divmod(whole_seconds, 3600)
+    minutes, whole_seconds = np.divmod(remainder, 60)
+    characters = np.empty((len(fraction), REALTIME_WIDTH), dtype=np.int64)
+    for position, value in ((0, hours), (3, minutes), (6, whole_seconds)):
+        characters[:, position], characters[:, position + 1] = np.divmod(value, 10)
+    characters[:, 9:] = fraction[:, None] // REALTIME_DIGIT_TICKS[9:] % 10
+    characters += ord('0')
+    for position, separator in REALTIME_SEPARATORS.items():
+        characters[:, position] = ord(separator)
+    formatted[fixed_width] = characters.astype(np.uint32).view(f'U{REALTIME_WIDTH}').ravel()
+    return formatted.reshape(shape)
+
 def seconds_to_playtime(seconds):
     days, seconds = divmod(seconds, 86400)
     hours, seconds = divmod(seconds, 3600)
@@ -305,97 +353,277 @@ def seconds_to_playtime(seconds):
 # <SegmentHistory> weighted calculations
 #-----------------------------------
 
-# calculates a weighted average (looking at all runs)
-def get_weighted_average_time(segment_history):
-    sorted_times = [time_to_seconds(real_time) for real_time in segment_history.values() if real_time]
-    sorted_times.sort()
-    
-    # calculate interquartile range (IQR)
-    q1 = np.percentile(sorted_times, 25)
-    q3 = np.percentile(sorted_times, 75)
-    iqr = q3 - q1
-    
-    # handle the data being heavily skewed in one half
-    median = np.percentile(sorted_times, 50)
-    #skewness = skew(sorted_times)
-    #threshold_multiplier = 1.5 + 0.5 * skewness
-    
-    lower_threshold = q1 - 1.5 * iqr
-    upper_threshold = q3 + 1.5 * iqr
-    
-    filtered_times = [time for time in sorted_times if lower_threshold <= time <= upper_threshold]
-    
-    total_weighted_time = 0.0
-    total_weight = 0.0
-    
-    count = len(filtered_times)
-    for index, time_seconds in enumerate(filtered_times):
-        weight = 0.0
-        if index < 0.50 * count:
-            weight = 0.1
-        elif index < 0.85 * count:
-            weight = 0.5
-        else:
-            weight = 2.0
-            
-        total_weighted_time += weight * time_seconds
-        total_weight += weight
-        
-    if total_weight == 0:
-        return ''
-    
-    weighted_average_time = total_weighted_time / total_weight
-    return seconds_to_time(weighted_average_time)
+# weights used for the weighted calculations: the first 50% of times get 0.1,
+# the next 35% get 0.5 and the remaining 15% get 2.0
+def get_weights(count):
+    index = np.arange(count)
+    return np.where(index < 0.50 * count, 0.1, np.where(index < 0.85 * count, 0.5, 2.0))
 
-# calculates a weighted standard deviation (looking at the most recent 50% of runs)
-def get_weighted_std_dev(segment_history):
-    times_in_seconds = [time_to_seconds(real_time) for real_time in segment_history.values()]
-    times_in_seconds = times_in_seconds[int(len(times_in_seconds)/2):]
-    
-    mean_time = np.mean(times_in_seconds)
-    std_dev = np.std(times_in_seconds)
-    z_scores = [(time - mean_time) / std_dev for time in times_in_seconds]
-    
-    z_score_threshold = 2.0
-    
-    filtered_times = [time for time, z_score in zip(times_in_seconds, z_scores) if abs(z_score) <= z_score_threshold]
-    
-    count = len(filtered_times)
-    weights = [0.1 if index < 0.5 * count else (0.5 if index < 0.85 * count else 2.0) for index in range(count)]
+#-----------------------------------
+# Fused <SegmentHistory> statistics
+#-----------------------------------
+
+# computes every statistic for a segment from a single sort of its history:
+# quartiles and IQR filtering, weighted average/median/standard deviation, decent rate,
+# best/worst times with their attempt ids, the gold's attempt id and the sum of all times.
+# gold_time is in seconds, None if there's no gold
+def get_segment_summary(segment_history, gold_time):
+    summary = segment_summary()
+    times = segment_history.times
+    ids = segment_history.ids
+    
+    count = len(times)
+    summary.count = count
+    if count == 0:
+        return summary
+    
+    summary.total = float(np.sum(times))
+    
+    # first attempt with the best/worst time
+    best_index = np.argmin(times)
+    worst_index = np.argmax(times)
+    summary.best, summary.best_id = float(times[best_index]), int(ids[best_index])
+    summary.worst, summary.worst_id = float(times[worst_index]), int(ids[worst_index])
+    
+    # first attempt whose time matches the gold, none if the gold was edited manually
+    gold_seconds = gold_time if gold_time is not None else 0.0
+    gold_matches = np.flatnonzero(times == gold_seconds)
+    if len(gold_matches) > 0:
+        summary.gold_id = int(ids[gold_matches[0]])
+    
+    # within 3% of gold
+    summary.decent_rate = float(np.count_nonzero(times - 0.03 * gold_seconds <= gold_seconds) / count * 100)
+    
+    # quartiles, then everything within 1.5 * IQR is a contiguous slice of the sorted times
+    sorted_times = np.sort(times)
+    summary.q1, summary.q3 = (float(quartile) for quartile in np.percentile(sorted_times, [25, 75]))
+    iqr = summary.q3 - summary.q1
+    start = np.searchsorted(sorted_times, summary.q1 - 1.5 * iqr, side='left')
+    end = np.searchsorted(sorted_times, summary.q3 + 1.5 * iqr, side='right')
+    filtered_times = sorted_times[start:end]
+    
+    filtered_count = len(filtered_times)
+    if filtered_count > 0:
+        weights = get_weights(filtered_count)
+        summary.average = float(np.sum(weights * filtered_times) / np.sum(weights))
+        
+        middle = filtered_count // 2
+        if filtered_count % 2 == 0:
+            summary.median = float((filtered_times[middle - 1] + filtered_times[middle]) / 2)
+        else:
+            summary.median = float(filtered_times[middle])
     
-    weighted_std_dev_seconds = np.sqrt(np.average(np.square(filtered_times - mean_time), weights=weights))
+    # standard deviation of the most recent 50% of runs, dropping times more than 2 deviations out
+    recent_times = times[count // 2:]
+    mean_time = np.mean(recent_times)
+    std_dev = np.std(recent_times)
+    if std_dev > 0:
+        recent_times = recent_times[np.abs((recent_times - mean_time) / std_dev) <= 2.0]
+    weights = get_weights(len(recent_times))
+    summary.stdev = float(np.sqrt(np.average(np.square(recent_times - mean_time), weights=weights)))
     
-    return seconds_to_time(weighted_std_dev_seconds)
+    return summary
 
-def get_weighted_median_time(segment_history):
-    time_list = [time_to_seconds(real_time) for real_time in segment_history.values() if real_time]
+#-----------------------------------
+# Running statistics
+#-----------------------------------
 
-    # get IQR to find/remove outliers
-    q1 = np.percentile(time_list, 25)
-    q3 = np.percentile(time_list, 75)
-    iqr = q3 - q1
-    lower_threshold = q1 - 1.5 * iqr
-    upper_threshold = q3 + 1.5 * iqr
-    
-    # remove the outliers
-    filtered_times = [time for time in time_list if lower_threshold <= time <= upper_threshold]
+# quantiles tracked by running_stats(): first quartile, median, third quartile
+RUNNING_QUANTILES = (0.25, 0.5, 0.75)
+
+# P² needs this many times before its markers can be placed
+P2_MARKERS = 5
+
+# places the 5 P² markers for quantile on sorted_times (at least P2_MARKERS of them):
+# the minimum, quantile / 2, quantile, (1 + quantile) / 2 and the maximum.
+# returns (heights, positions, desired positions), positions are 1-based ranks
+def get_quantile_markers(sorted_times, quantile):
+    count = len(sorted_times)
+    increments = (0.0, quantile / 2, quantile, (1 + quantile) / 2, 1.0)
+    desired = [1 + (count - 1) * increment for increment in increments]
+    
+    # every marker needs its own rank: the outer markers stay on the minimum and maximum
+    # and the middle ones are spread between them, all within [1, count]
+    positions = [int(round(position)) for position in desired]
+    positions[0], positions[-1] = 1, count
+    for i in range(1, P2_MARKERS - 1):
+        positions[i] = max(positions[i], positions[i - 1] + 1)
+    for i in range(P2_MARKERS - 2, -1, -1):
+        positions[i] = min(positions[i], positions[i + 1] - 1)
+    
+    heights = [float(sorted_times[position - 1]) for position in positions]
+    return heights, positions, desired
+
+# adds one time to a P² sketch (Jain & Chlamtac), moving the middle markers towards their
+# desired positions with a parabolic (or, if that overshoots, linear) height adjustment
+def add_quantile_time(heights, positions, desired, quantile, time):
+    if time < heights[0]:
+        heights[0] = time
+        cell = 0
+    elif time >= heights[-1]:
+        heights[-1] = time
+        cell = P2_MARKERS - 2
+    else:
+        cell = next(i for i in range(P2_MARKERS - 1) if heights[i] <= time < heights[i + 1])
+    
+    for i in range(cell + 1, P2_MARKERS):
+        positions[i] += 1
+    for i, increment in enumerate((0.0, quantile / 2, quantile, (1 + quantile) / 2, 1.0)):
+        desired[i] += increment
+    
+    for i in range(1, P2_MARKERS - 1):
+        offset = desired[i] - positions[i]
+        if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (offset <= -1 and positions[i - 1] - positions[i] < -1):
+            step = 1 if offset > 0 else -1
+            height = heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+                (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+                + (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+            if not heights[i - 1] < height < heights[i + 1]:
+                height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+            heights[i] = height
+            positions[i] += step
+
+# builds a running_stats() from a whole history in one go
+def make_running_stats(times):
+    running = running_stats()
+    update_running_stats(running, times)
+    return running
+
+# adds new times (seconds) to a running_stats(). the count, sum, mean and variance are merged
+# as one batch (Chan et al.'s pairwise form of Welford's update), each time then updates the quantile sketches
+def update_running_stats(running, times):
+    times = np.asarray(times, dtype=np.float64)
+    count = len(times)
+    if count == 0:
+        return running
+    
+    batch_mean = float(np.mean(times))
+    batch_m2 = float(np.sum(np.square(times - batch_mean)))
+    total_count = running.count + count
+    delta = batch_mean - running.mean
+    running.mean += delta * count / total_count
+    running.m2 += batch_m2 + delta * delta * running.count * count / total_count
+    running.count = total_count
+    running.total += float(np.sum(times))
+    running.best = float(times.min()) if running.best is None else min(running.best, float(times.min()))
+    running.worst = float(times.max()) if running.worst is None else max(running.worst, float(times.max()))
+    
+    if not running.heights:
+        # not enough times for the markers yet, place them exactly once there are
+        running.first_times += times.tolist()
+        if len(running.first_times) < P2_MARKERS:
+            return running
+        sorted_times = np.sort(running.first_times)
+        for quantile in RUNNING_QUANTILES:
+            heights, positions, desired = get_quantile_markers(sorted_times, quantile)
+            running.heights.append(heights)
+            running.positions.append(positions)
+            running.desired.append(desired)
+        running.first_times = []
+        return running
+    
+    for time in times.tolist():
+        for i, quantile in enumerate(RUNNING_QUANTILES):
+            add_quantile_time(running.heights[i], running.positions[i], running.desired[i], quantile, time)
+    return running
+
+# estimate of RUNNING_QUANTILES[index] in seconds, None without any times
+def get_running_quantile(running, index):
+    if running.heights:
+        return running.heights[index][2]
+    if running.first_times:
+        return float(np.percentile(running.first_times, RUNNING_QUANTILES[index] * 100))
+    return None
+
+# standard deviation of every time added to a running_stats(), None without any times
+def get_running_std_dev(running):
+    if running.count == 0:
+        return None
+    return (running.m2 / running.count) ** 0.5
 
-    # calculate median
-    n = len(filtered_times)
-    if n == 0:
-        return ''
-    
-    filtered_times.sort()
+#-----------------------------------
+# Rolling statistics
+#-----------------------------------
 
-    # even number of times
-    if n % 2 == 0:
-        middle1 = filtered_times[n // 2 - 1]
-        middle2 = filtered_times[n // 2]
-        median_in_seconds = (middle1 + middle2) / 2
-    # odd number of times
-    else:
-        median_in_seconds = filtered_times[n // 2]
+# how many of the most recent times rolling statistics are taken over
+ROLLING_WINDOW = 50
+
+# about how many times get_rolling_std_dev works on at once
+ROLLING_BLOCK = 1 << 20
+
+# RUNNING_QUANTILES of every window of the last window times, as a times x quantiles array. the window is kept
+# sorted as it slides: each time is inserted and the one leaving is removed by binary search, so nothing is sorted
+# again. that's O(log window) comparisons per time but O(window) list shifts, i.e. O(n * window) moves overall; the
+# shifts are a single memmove each, which at the default window is ~3x faster than two heaps with lazy deletion.
+# quantiles are interpolated like np.percentile, windows are shorter for the first times
+def get_rolling_quantiles(times, window=ROLLING_WINDOW):
+    times = np.asarray(times, dtype=np.float64).tolist()
+    quantiles = np.empty((len(times), len(RUNNING_QUANTILES)))
+    ordered = []
+    for index, time in enumerate(times):
+        bisect.insort(ordered, time)
+        if index >= window:
+            del ordered[bisect.bisect_left(ordered, times[index - window])]
+        
+        last = len(ordered) - 1
+        for column, quantile in enumerate(RUNNING_QUANTILES):
+            position = quantile * last
+            lower = int(position)
+            upper = min(lower + 1, last)
+            quantiles[index, column] = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+    return quantiles
+
+# standard deviation of every window of the last window times, windows are shorter for the first times.
+# each window's deviation is taken from its own mean with np.std over views into times, a block of windows at a time.
+# that's O(n * window) arithmetic, but unlike updating a running mean and sum of squares as the window slides
+# it leaves no rounding residue behind (e.g. a small deviation for a window of identical times)
+def get_rolling_std_dev(times, window=ROLLING_WINDOW):
+    times = np.asarray(times, dtype=np.float64)
+    std_devs = np.empty(len(times))
+    head = min(window - 1, len(times))
+    for index in range(head):
+        std_devs[index] = np.std(times[:index + 1])
+    if len(times) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(times, window)
+        block = max(ROLLING_BLOCK // window, 1)
+        for start in range(0, len(windows), block):
+            std_devs[head + start:head + start + block] = np.std(windows[start:start + block], axis=1)
+    return std_devs
+
+# rolling_stats() of a time_history(): quartiles, median and standard deviation of the last window times
+# as of each time in the history
+def get_rolling_stats(history, window=ROLLING_WINDOW):
+    quantiles = get_rolling_quantiles(history.times, window)
+    return rolling_stats(window, history.ids, quantiles[:, 0], quantiles[:, 1], quantiles[:, 2], get_rolling_std_dev(history.times, window))
+
+# get_rolling_stats of the segments of an lss() in segment_indexes (default all), as {segment index: rolling_stats()}
+def get_all_rolling_stats(split_file, segment_indexes=None, window=ROLLING_WINDOW):
+    if segment_indexes is None:
+        segment_indexes = range(len(split_file.segments))
+    return {index: get_rolling_stats(split_file.segments[index].segment_history, window) for index in segment_indexes}
+
+#-----------------------------------
+# Output formatting
+#-----------------------------------
+
+# formats seconds with seconds_to_time, missing if there's no time
+def format_time(seconds, missing=''):
+    return seconds_to_time(seconds) if seconds is not None else missing
+
+# formats seconds with seconds_to_realtime, missing if there's no time
+def format_realtime(seconds, missing=''):
+    return seconds_to_realtime(seconds) if seconds is not None else missing
 
-    return seconds_to_time(median_in_seconds)
+# formats a percentage with two decimals, missing if there isn't one (None or NaN)
+def format_rate(rate, missing=''):
+    return '{:.2f}%'.format(rate) if rate is not None and rate == rate else missing
 
+# formats an attempt id, empty if there's no attempt
+def format_id(attempt_id):
+    return str(attempt_id) if attempt_id is not None else ''
 
+# formats when an attempt started as (date, time), '?' for both if it isn't known
+def format_started(started):
+    if started is None:
+        return '?', '?'
+    return started.strftime('%m/%d/%Y'), started.strftime('%H:%M:%S')
@@ -0,0 +1,80 @@
+# Dependencies
+import numpy as np
+
+# Locals
+from lss import attempt_matrix, reset_funnel
+
+# builds the attempt_matrix() of an lss(): one row per attempt in <AttemptHistory>, one column per segment, holding
+# the time each attempt recorded in each segment. times that cover skipped splits (see reconcile_skipped_splits) are
+# included unless include_skipped is False. everything comes from the segment histories that were already read,
+# nothing is parsed again. times of attempts that aren't in <AttemptHistory> (e.g. imported with id 0 or below) are left out
+def build_attempt_matrix(split_data, include_skipped=True):
+    attempts = list(split_data.attempts.values())
+    attempt_ids = np.array([attempt.id for attempt in attempts], dtype=np.int32)
+    finished = np.array([attempt.real_time is not None for attempt in attempts], dtype=bool)
+    times = np.full((len(attempts), len(split_data.segments)), np.nan)
+
+    # attempt id -> row, -1 for ids without a row
+    rows = np.full(int(attempt_ids.max(initial=0)) + 1, -1, dtype=np.int64)
+    rows[attempt_ids[attempt_ids > 0]] = np.flatnonzero(attempt_ids > 0)
+
+    for index, current_segment in enumerate(split_data.segments):
+        history = current_segment.raw_history if include_skipped else current_segment.segment_history
+        ids = history.ids
+        in_range = (ids > 0) & (ids < len(rows))
+        history_rows = rows[ids[in_range]]
+        has_row = history_rows >= 0
+        times[history_rows[has_row], index] = history.times[in_range][has_row]
+
+    return attempt_matrix(attempt_ids, times, finished)
+
+# how many segments each attempt finished: every segment for a finished run, otherwise up to the last segment it
+# has a time in (a skipped split before that counts as finished)
+def get_segments_finished(matrix):
+    segment_count = matrix.times.shape[1]
+    has_time = ~np.isnan(matrix.times)
+
+    # the last column with a time, counted from the end
+    last = segment_count - np.argmax(has_time[:, ::-1], axis=1)
+    last = np.where(has_time.any(axis=1), last, 0)
+    return np.where(matrix.finished, segment_count, last)
+
+# the reset_funnel() of an attempt_matrix(): for every segment how many attempts reached it, finished it and reset in it,
+# as well as the reset rate, the chance to finish the segment and the chance to finish the run once it's reached
+def get_reset_funnel(matrix):
+    segment_count = matrix.times.shape[1]
+    segments_finished = get_segments_finished(matrix)
+
+    # attempts that finished exactly k segments for every k, an attempt reached segment j if it finished at least j
+    stopped = np.bincount(segments_finished, minlength=segment_count + 1)
+    at_least = np.cumsum(stopped[::-1])[::-1]
+    reached = at_least[:segment_count]
+    completed = at_least[1:]
+
+    funnel = reset_funnel(reached, completed, reached - completed)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        funnel.reset_rate = np.where(reached > 0, funnel.resets / reached * 100, np.nan)
+        funnel.completion_rate = np.where(reached > 0, completed / reached * 100, np.nan)
+        funnel.run_completion_rate = np.where(reached > 0, np.count_nonzero(matrix.finished) / reached * 100, np.nan)
+    return funnel
+
+# reconstructs the split time of every attempt at every segment (attempts x segments, seconds): the running sum of
+# its segment times. NaN where it has no time of its own, i.e. not reached or skipped
+def get_split_time_matrix(matrix):
+    split_times = np.nancumsum(matrix.times, axis=1)
+    return np.where(np.isnan(matrix.times), np.nan, split_times)
+
+# the gold of every segment as it was after each attempt (attempts x segments, seconds), rows in attempt id order:
+# a running minimum down each column, NaN until the segment has a time. build the matrix without skipped times,
+# they can't be golds
+def get_gold_timeline(matrix):
+    order = np.argsort(matrix.attempt_ids, kind='stable')
+    return matrix.attempt_ids[order], np.fmin.accumulate(matrix.times[order], axis=0)
+
+# the sum of best after each attempt, as (attempt ids, sum of best in seconds) in attempt id order.
+# attempts before every segment had a time are left out
+def get_sum_of_best_timeline(matrix):
+    attempt_ids, golds = get_gold_timeline(matrix)
+    sum_of_best = golds.sum(axis=1)
+    has_sum = ~np.isnan(sum_of_best)
+    return attempt_ids[has_sum], sum_of_best[has_sum]
@@ -1,7 +1,9 @@
 from lssHelper import *
 from lss import *  
+from lssProfile import profile_stage, profiled
 
 # Opens a .lss file and returns the root of the XML tree if valid
+@profiled()
 def open_lss_file(file_path):
     try:
         tree = ET.parse(file_path)
@@ -10,146 +12,286 @@ def open_lss_file(file_path):
     except (FileNotFoundError, ET.ParseError) as e:
         print(f'Error: {e}')
 
+# Streams a .lss file with iterparse, yielding the same elements as iter_run_elements.
+# Each <Attempt> and <Segment> is cleared and detached once it has been read so
+# memory stays bounded by a single segment rather than the whole tree
+def iterparse_run_elements(file_path):
+    context = ET.iterparse(file_path, events=('start', 'end'))
+    _, root = next(context)
+    
+    # elements currently open, starting with <Run>
+    parents = [root]
+    for event, element in context:
+        if event == 'start':
+            parents.append(element)
+            continue
+        
+        parents.pop()
+        if element is root:
+            break
+        
+        parent = parents[-1]
+        if parent is root:
+            # <AttemptHistory> and <Segments> were already emitted child by child
+            if element.tag not in ('AttemptHistory', 'Segments'):
+                yield element
+            element.clear()
+            root.remove(element)
+        elif (parent.tag, element.tag) in (('AttemptHistory', 'Attempt'), ('Segments', 'Segment')) and parents[-2] is root:
+            yield element
+            element.clear()
+            parent.remove(element)
+
+# walks an already parsed tree, yielding the direct children of <Run>
+# except that <AttemptHistory> and <Segments> are replaced by their children
+def iter_run_elements(root):
+    for element in root:
+        if element.tag in ('AttemptHistory', 'Segments'):
+            yield from element
+        else:
+            yield element
+
 # reads the .lss file starting at the top of the tree,
 # stores retrieved values and calculated values in lss() data structure
 # data structure defined in lss.py 
-def read_lss_file(root, folder_path):
-    split_file = lss()
-    #split_file.segments = []
-        
-    # get basic info about the splits
-    split_file.output_dir = folder_path
-    split_file.game_name = root.findtext('GameName', default='')
-    split_file.category_name = root.findtext('CategoryName', default='')
-    split_file.layout_path = root.findtext('LayoutPath', default='')
-    split_file.timer_offset = root.findtext('Offset', default='')
-    split_file.runs_started = count_attempts(root)
-    split_file.runs_finished = count_runs_finished(root)
-    split_file.total_playtime = get_total_playtime(root.find('AttemptHistory'))
-    split_file.finished_run_times = get_finished_runs(root.find('AttemptHistory'))
+@profiled()
+def read_lss_file(root, folder_path, stats_workers=1):
+    return build_lss_file(iter_run_elements(root), folder_path, stats_workers=stats_workers)
+
+# reads the .lss file one <Attempt>/<Segment> at a time without keeping the tree in memory,
+# returns the same lss() data structure as read_lss_file.
+# with an lss_cache() from an earlier read only times after its high water mark are parsed
+@profiled()
+def stream_lss_file(file_path, folder_path, cache=None, stats_workers=1):
+    try:
+        return build_lss_file(iterparse_run_elements(file_path), folder_path, cache, stats_workers)
+    except (FileNotFoundError, ET.ParseError) as e:
+        print(f'Error: {e}')
+
+# builds the lss() data structure from the elements yielded by
+# iter_run_elements or iterparse_run_elements.
+# every timing method is read in the same pass: the RealTime lss() is returned with the GameTime one as its game_time.
+# cache is an optional lss_cache() of an earlier read of the same file: attempts and times up to its
+# high water mark are taken from it and segments whose history didn't change keep their statistics.
+# with stats_workers > 1 the statistics of every segment that needs them are calculated once the whole file is read,
+# spread across that many processes (see get_segment_summaries)
+def build_lss_file(elements, folder_path, cache=None, stats_workers=1):
+    timings = {timing_method: lss(output_dir=folder_path, timing_method=timing_method) for timing_method in TIMING_METHODS}
+    split_file = timings['RealTime']
     
     # variables to track sum of best and total splits time
-    sum_of_best = 0.0
-    total_runtime = 0.0
+    sum_of_best = dict.fromkeys(TIMING_METHODS, 0.0)
+    total_runtime = dict.fromkeys(TIMING_METHODS, 0.0)
     
     # track previous split time to get segment time in PB
-    previous_split_time_seconds = 0.0
-    
-    # <Segment> parsing
-    # Organization:
-    # <Segment>
-    #  <Name>
-    #  <Icon>
-    #  <SplitTimes>
-    #   <SplitTime name="Personal Best">
-    #  <BestSegmentTime>
-    #  <SegmentHistory>
-    #   <Time id="number">
-    #    <RealTime>
-    file_segments = root.findall('.//Segment')
-    previous_segment_history = None
-    for index, segment in enumerate(file_segments, start=1):
-        # initialize segment_data() struct to hold segment info
-        current_segment = segment_data()
-        
-        # get <Segment><Name>
-        current_segment.name = segment.findtext('Name', default='')
-        
-        # get <Segment><SplitTimes><SplitTime name="Personal Best"><RealTime>
-        current_segment.split_time_pb = get_splittime_pb(segment.find('SplitTimes'), 'Personal Best')
-        
-        # get <Segment><BestSegmentTime><RealTime>
-        current_segment.segment_gold.time = get_real_time(segment.find('BestSegmentTime'))
-        
-        # gold segment may have been edited or added manually, i.e. not tracked
-        manual_gold = False
-        
-        # calculate segment time in PB - only split times are there by default
-        current_segment.segment_pb = None
-        # for the first split only, segment time is the same as split time
-        if index == 1:
-            current_segment.segment_pb = current_segment.split_time_pb
-            previous_split_time_seconds = time_to_seconds(current_segment.split_time_pb)
-        else:
-            pb_segment_seconds = time_to_seconds(current_segment.split_time_pb)
-            pb_segment_time_seconds = pb_segment_seconds - previous_split_time_seconds
-            current_segment.segment_pb = seconds_to_time(pb_segment_time_seconds)
-            previous_split_time_seconds = pb_segment_seconds
-        
-        # associates time id="number" with RealTime
-        segment_history = make_dictionary(segment.find('SegmentHistory'))
-        
-        # remove times that don't have a RealTime component
-        empty_keys = [key for key, value in segment_history.items() if not value]
-        for key in empty_keys:
-            segment_history.pop(key)
+    previous_split_times = dict.fromkeys(TIMING_METHODS, 0.0)
+    previous_oldest_id = None
+    
+    # attempt id -> last segment it has a time in, for each timing method, see reconcile_skipped_splits
+    last_seen = {timing_method: np.full(0, -1, dtype=np.int32) for timing_method in TIMING_METHODS}
+    
+    high_water_mark = cache.high_water_mark if cache is not None else None
+    cached_timings = {}
+    pending_segments = []
+    if cache is not None:
+        cached_timings = {'RealTime': cache.split_file, 'GameTime': cache.split_file.game_time}
+    
+    for element in elements:
+        if element.tag == 'GameName':
+            split_file.game_name = element.text or ''
+        elif element.tag == 'CategoryName':
+            split_file.category_name = element.text or ''
+        elif element.tag == 'LayoutPath':
+            split_file.layout_path = element.text or ''
+        elif element.tag == 'Offset':
+            split_file.timer_offset = element.text or ''
+        elif element.tag == 'Attempt':
+            attempt_id = int(element.get('id'))
+            if cache is not None and attempt_id <= high_water_mark and attempt_id in cache.split_file.attempts:
+                split_file.attempts[attempt_id] = cache.split_file.attempts[attempt_id]
+                continue
+            run_times = get_times(element)
+            split_file.attempts[attempt_id] = attempt_data(attempt_id, get_attempt_datetime(element, 'started'), get_attempt_datetime(element, 'ended'),
+                                                           realtime_to_seconds(run_times['RealTime']), realtime_to_seconds(run_times['GameTime']))
+        elif element.tag == 'Segment':
+            index = len(split_file.segments)
+            cached_segments = {timing_method: timing.segments[index] for timing_method, timing in cached_timings.items()
+                               if timing is not None and index < len(timing.segments)}
+            current_segments, previous_split_times, folded = read_segment(element, index + 1, previous_split_times, cached_segments, high_water_mark)
+            
+            for timing_method, current_segment in current_segments.items():
+                cached_segment = cached_segments.get(timing_method)
                 
-        # check previous segment history and account for inflated times due to skipping the previous split
-        if previous_segment_history is not None:
-            inflated_time_ids = get_inflated_time_ids(previous_segment_history, segment_history)
-            if len(inflated_time_ids) > 0:
-                for id in inflated_time_ids:
-                    if id not in previous_segment_history:
-                        segment_history.pop(id)
-                        
-        previous_segment_history = segment_history.copy()
-        
-        current_segment.segment_history = segment_history
-        
-        # update sum of best and total runtime
-        sum_of_best += time_to_seconds(current_segment.segment_gold.time)
-        total_runtime += get_segment_sum(segment_history)
-                    
-        # find the attempt whose time matches the best segment time & the date/time for that run
-        current_segment.segment_gold.id = get_gold_id(segment_history, current_segment.segment_gold.time)
-        if current_segment.segment_gold.id == '':
-            manual_gold = True
-        
-        if not manual_gold:
-            best_segment_date_time = get_attempt_date(current_segment.segment_gold.id, root)
-            if best_segment_date_time != '':
-                current_segment.segment_gold.run_date = best_segment_date_time[0]
-                current_segment.segment_gold.run_time = best_segment_date_time[1]
-            else:
-                current_segment.segment_gold.run_date = '?'
-                current_segment.segment_gold.run_time = '?'
-        else:
-            current_segment.segment_gold.run_date = '?'
-            current_segment.segment_gold.run_time = '?'
-        
-        current_segment.possible_time_save = seconds_to_time(time_to_seconds(current_segment.segment_pb) - time_to_seconds(current_segment.segment_gold.time))
+                # take out times that cover skipped splits before any statistics are calculated
+                with profile_stage('reconcile_skipped_splits'):
+                    (current_segment.segment_history, current_segment.skipped_history,
+                     current_segment.skipped_from, last_seen[timing_method]) = reconcile_skipped_splits(last_seen[timing_method], index, previous_oldest_id, current_segment.raw_history)
+                
+                # statistics only need recomputing if this segment's history or gold changed
+                if (folded and current_segment.segment_gold.time == cached_segment.segment_gold.time
+                        and np.array_equal(current_segment.segment_history.ids, cached_segment.segment_history.ids)):
+                    reuse_segment_analysis(current_segment, cached_segment)
+                elif stats_workers > 1:
+                    pending_segments.append(current_segment)
+                else:
+                    analyze_segment(current_segment)
+                
+                timings[timing_method].segments.append(current_segment)
+            
+            previous_oldest_id = current_segments['RealTime'].oldest_attempt_id
+    
+    if pending_segments:
+        analyze_segments_shared(pending_segments, stats_workers)
+    
+    # everything below is served from the attempt index built from <AttemptHistory>, which every timing method shares
+    attempts = split_file.attempts
+    for timing_method, timing in timings.items():
+        timing.game_name, timing.category_name = split_file.game_name, split_file.category_name
+        timing.layout_path, timing.timer_offset = split_file.layout_path, split_file.timer_offset
+        timing.attempts = attempts
+        timing.runs_started = count_attempts(attempts)
+        timing.runs_finished = count_runs_finished(attempts)
+        timing.total_playtime = get_total_playtime(attempts)
+        timing.finished_run_times = get_finished_runs(attempts, timing_method)
         
-        # handle the case where the split was skipped in PB
-        if time_to_seconds(current_segment.possible_time_save) > time_to_seconds(current_segment.segment_pb):
-            current_segment.possible_time_save = seconds_to_time(0)
+        for current_segment in timing.segments:
+            # the gold segment may have been edited or added manually, i.e. not tracked, and has no attempt
+            current_segment.segment_gold.started = get_attempt_started(current_segment.segment_gold.id, attempts)
+            current_segment.segment_worst.started = get_attempt_started(current_segment.segment_worst.id, attempts)
+            
+            # percentage of times segment was finished : total runs started
+            current_segment.finished_rate = get_percent_finished(timing.runs_started, current_segment.segment_history)
+            
+            # update sum of best and total runtime
+            if current_segment.segment_gold.time is not None:
+                sum_of_best[timing_method] += current_segment.segment_gold.time
+            total_runtime[timing_method] += current_segment.summary.total
         
-        # find the worst segment info (must be found manually)
-        worst_segment_info = get_worst_time(segment_history)
-        current_segment.segment_worst.id = worst_segment_info[0]
-        current_segment.segment_worst.time = worst_segment_info[1]
-        worst_segment_date_time = get_attempt_date(current_segment.segment_worst.id, root)
-        if worst_segment_date_time != '':
-            current_segment.segment_worst.run_date = worst_segment_date_time[0]
-            current_segment.segment_worst.run_time = worst_segment_date_time[1]
-        else:
-            current_segment.segment_worst.run_date = '?'
-            current_segment.segment_worst.run_time = '?'
+        timing.sob = sum_of_best[timing_method]
+        timing.total_runtime = total_runtime[timing_method]
+    
+    split_file.game_time = timings['GameTime']
+    return split_file
+
+# reads a single <Segment> with every timing method at once. returns {timing method: segment_data()}
+# (without statistics, see analyze_segment), {timing method: PB split time in seconds}
+# and whether cached_segments' histories were folded in.
+# when cached_segments ({timing method: segment_data()}) are given and still match,
+# only times after high_water_mark are parsed
+# <Segment> parsing
+# Organization:
+# <Segment>
+#  <Name>
+#  <Icon>
+#  <SplitTimes>
+#   <SplitTime name="Personal Best">
+#  <BestSegmentTime>
+#  <SegmentHistory>
+#   <Time id="number">
+#    <RealTime>
+#    <GameTime>
+@profiled()
+def read_segment(segment, index, previous_split_times, cached_segments=None, high_water_mark=None):
+    # get <Segment><Name>
+    name = segment.findtext('Name', default='')
+    
+    # get <Segment><SplitTimes><SplitTime name="Personal Best"> and <Segment><BestSegmentTime>
+    split_times_pb = get_splittimes_pb(segment.find('SplitTimes'), 'Personal Best')
+    gold_times = get_times(segment.find('BestSegmentTime'))
+    
+    # initialize a segment_data() struct for each timing method to hold segment info
+    current_segments = {}
+    previous_split_times = dict(previous_split_times)
+    for timing_method in TIMING_METHODS:
+        current_segment = segment_data(name=name)
+        current_segment.split_time_pb = realtime_to_seconds(split_times_pb[timing_method])
+        current_segment.segment_gold.time = realtime_to_seconds(gold_times[timing_method])
+        previous_split_times[timing_method] = set_segment_pb(current_segment, index, previous_split_times[timing_method])
+        current_segments[timing_method] = current_segment
+    
+    # associates time id="number" with RealTime/GameTime in seconds, skipping times without that timing method
+    with profile_stage('read_segment.history_extraction'):
+        segment_history_element = segment.find('SegmentHistory')
+        folded = False
+        if (cached_segments and all(timing_method in cached_segments for timing_method in TIMING_METHODS)
+                and cached_segments['RealTime'].name == name):
+            # the cached times are only reused if the file still has the same number of them
+            new_histories, old_time_count, time_count = make_time_histories_after(segment_history_element, high_water_mark)
+            if old_time_count == cached_segments['RealTime'].time_count:
+                for timing_method, current_segment in current_segments.items():
+                    cached_history, new_history = cached_segments[timing_method].raw_history, new_histories[timing_method]
+                    current_segment.raw_history = time_history(np.concatenate((cached_history.ids, new_history.ids)),
+                                                               np.concatenate((cached_history.times, new_history.times)))
+                    current_segment.time_count = time_count
+                folded = True
         
-        # calculate segment statistics: average, median, standard deviation
-        current_segment.stats.average = get_weighted_average_time(segment_history)
-        current_segment.stats.median = get_weighted_median_time(segment_history)
-        current_segment.stats.stdev = get_weighted_std_dev(segment_history)
-                
-        # percentage of times segment was finished : total runs started
-        current_segment.stats.finished_rate = get_percent_finished(split_file.runs_started, segment_history)
+        if not folded:
+            histories = make_time_histories(segment_history_element)
+            time_count = len(segment_history_element.findall('Time'))
+            for timing_method, current_segment in current_segments.items():
+                current_segment.raw_history = histories[timing_method]
+                current_segment.time_count = time_count
         
-        # percentage that this segment was above average
-        current_segment.stats.decent_rate = get_above_average_rate(segment_history, current_segment.segment_gold.time)
+        oldest_attempt_id = get_oldest_attempt_id(segment_history_element)
+        for current_segment in current_segments.values():
+            current_segment.oldest_attempt_id = oldest_attempt_id
+    
+    return current_segments, previous_split_times, folded
 
-        split_file.segments.append(current_segment)
+# sets the segment time in PB and the possible time save of a segment_data() whose PB split time and gold are read,
+# returns its PB split time in seconds for the next segment
+def set_segment_pb(current_segment, index, previous_split_time_seconds):
+    # calculate segment time in PB - only split times are there by default, a split skipped in PB counts as 0
+    pb_split_seconds = current_segment.split_time_pb if current_segment.split_time_pb is not None else 0.0
+    # for the first split only, segment time is the same as split time
+    if index == 1:
+        current_segment.segment_pb = current_segment.split_time_pb
+    else:
+        current_segment.segment_pb = pb_split_seconds - previous_split_time_seconds
     
+    pb_segment_seconds = current_segment.segment_pb if current_segment.segment_pb is not None else 0.0
+    gold_seconds = current_segment.segment_gold.time if current_segment.segment_gold.time is not None else 0.0
+    current_segment.possible_time_save = pb_segment_seconds - gold_seconds
     
-    split_file.sob = seconds_to_time(sum_of_best)
-    split_file.total_runtime = seconds_to_playtime(total_runtime)
-    return split_file
-    
\ No newline at end of file
+    # handle the case where the split was skipped in PB (or the gold is out of date)
+    if not 0 <= current_segment.possible_time_save <= pb_segment_seconds:
+        current_segment.possible_time_save = 0.0
+    
+    return pb_split_seconds
+
+# calculates the statistics for a segment once reconcile_skipped_splits has set its segment_history
+@profiled()
+def analyze_segment(current_segment):
+    # all statistics come from a single pass over the history
+    with profile_stage('analyze_segment.stats'):
+        summary = get_segment_summary(current_segment.segment_history, current_segment.segment_gold.time)
+    set_segment_analysis(current_segment, summary)
+
+# analyze_segment for many segments at once, with their statistics spread across workers processes
+@profiled()
+def analyze_segments_shared(segments, workers):
+    # the process pool and shared memory are only loaded when statistics are actually spread out
+    from lssShared import get_segment_summaries
+    
+    summaries = get_segment_summaries([current_segment.segment_history for current_segment in segments],
+                                      [current_segment.segment_gold.time for current_segment in segments], workers)
+    for current_segment, summary in zip(segments, summaries):
+        set_segment_analysis(current_segment, summary)
+
+# fills in a segment_data()'s statistics from its segment_summary()
+def set_segment_analysis(current_segment, summary):
+    current_segment.summary = summary
+    
+    # the attempt whose time matches the best segment time
+    current_segment.segment_gold.id = summary.gold_id
+    
+    # the worst segment info (must be found manually)
+    current_segment.segment_worst.id = summary.worst_id
+    current_segment.segment_worst.time = summary.worst
+
+# copies the statistics of an unchanged segment from an earlier read
+def reuse_segment_analysis(current_segment, cached_segment):
+    current_segment.summary = cached_segment.summary
+    current_segment.segment_gold.id = cached_segment.segment_gold.id
+    current_segment.segment_worst.id = cached_segment.segment_worst.id
+    current_segment.segment_worst.time = cached_segment.segment_worst.time
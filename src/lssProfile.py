@@ -0,0 +1,107 @@
+# Imports
+import cProfile
+import functools
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Locals
+from lssHelper import log
+
+# opt-in instrumentation for finding hot spots. nothing is recorded (and profile_stage costs next
+# to nothing) until enable_profiling() is called. each stage records:
+# * calls: how many times it ran
+# * seconds: total wall time
+# * allocated_bytes: net memory still allocated when it finished (with track_allocations)
+# * peak_bytes: highest memory use above where it started (with track_allocations)
+# stage names use '.' for sub-stages, e.g. 'read_segment.history_extraction'
+stages = None
+track_allocations = False
+profiler = None
+
+# [memory when it started, peak so far] for each stage currently running, innermost last
+open_stages = []
+
+# starts recording stage timings, optionally with memory tracking (slower) and a cProfile capture
+def enable_profiling(allocations=False, capture_cprofile=False):
+    global stages, track_allocations, profiler
+    stages = {}
+    track_allocations = allocations
+    if track_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if capture_cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+# stops recording, the recorded stages are kept until profiling is enabled again
+def disable_profiling():
+    global profiler
+    if profiler is not None:
+        profiler.disable()
+    if track_allocations and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+# times the code inside the with block as the stage called name
+@contextmanager
+def profile_stage(name):
+    if stages is None:
+        yield
+        return
+
+    if track_allocations:
+        # a nested stage resets the peak, so hand the peak so far to the stage that contains it
+        current, peak = tracemalloc.get_traced_memory()
+        if open_stages:
+            open_stages[-1][1] = max(open_stages[-1][1], peak)
+        tracemalloc.reset_peak()
+        open_stages.append([current, current])
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage = stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'allocated_bytes': 0, 'peak_bytes': 0})
+        stage['calls'] += 1
+        stage['seconds'] += elapsed
+
+        if track_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            started_at, nested_peak = open_stages.pop()
+            peak = max(peak, nested_peak)
+            if open_stages:
+                open_stages[-1][1] = max(open_stages[-1][1], peak)
+            stage['allocated_bytes'] += current - started_at
+            stage['peak_bytes'] = max(stage['peak_bytes'], peak - started_at)
+
+# decorator form of profile_stage, the stage is named after the function unless name is given
+def profiled(name=None):
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profile_stage(stage_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# the recorded stages, slowest first
+def get_profile_report():
+    report = {'track_allocations': track_allocations, 'stages': {}}
+    for name, stage in sorted((stages or {}).items(), key=lambda item: item[1]['seconds'], reverse=True):
+        report['stages'][name] = dict(stage, seconds_per_call=stage['seconds'] / stage['calls'])
+        if not track_allocations:
+            del report['stages'][name]['allocated_bytes'], report['stages'][name]['peak_bytes']
+    return report
+
+# writes get_profile_report() as JSON, and the cProfile capture (if any) for pstats/snakeviz
+def write_profile_report(file_path, cprofile_path=None):
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(get_profile_report(), file, indent=2)
+    log('Successfully output profile report to', file_path)
+
+    if cprofile_path is not None and profiler is not None:
+        profiler.dump_stats(cprofile_path)
+        log('Successfully output cProfile capture to', cprofile_path)
@@ -0,0 +1,73 @@
+# Imports
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# Dependencies
+import numpy as np
+
+# Locals
+from lss import time_history
+from lssHelper import get_segment_summary
+
+# segments are handed to workers in about this many chunks per worker, so one long segment doesn't hold up the rest
+CHUNKS_PER_WORKER = 4
+
+# copies every history into one shared memory block: all the times (float64) followed by all the ids (int32),
+# segment i's times being [offsets[i], offsets[i + 1]). returns the block and the offsets, the caller unlinks the block
+def share_histories(histories):
+    offsets = np.zeros(len(histories) + 1, dtype=np.int64)
+    np.cumsum([len(history) for history in histories], out=offsets[1:])
+    total = int(offsets[-1])
+
+    block = shared_memory.SharedMemory(create=True, size=max(total * (8 + 4), 1))
+    times, ids = get_shared_arrays(block, total)
+    for index, history in enumerate(histories):
+        times[offsets[index]:offsets[index + 1]] = history.times
+        ids[offsets[index]:offsets[index + 1]] = history.ids
+    del times, ids
+    return block, offsets
+
+# the times and ids arrays laid out in a block by share_histories, as views without copying
+def get_shared_arrays(block, total):
+    times = np.ndarray((total,), dtype=np.float64, buffer=block.buf)
+    ids = np.ndarray((total,), dtype=np.int32, buffer=block.buf, offset=total * 8)
+    return times, ids
+
+# worker side of get_segment_summaries: attaches to the block by name and summarizes segments start to end
+# straight from the shared arrays. returns their segment_summary()s in order
+def summarize_shared_segments(block_name, offsets, gold_times, start, end):
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        times, ids = get_shared_arrays(block, int(offsets[-1]))
+        summaries = [get_segment_summary(time_history(ids[offsets[index]:offsets[index + 1]], times[offsets[index]:offsets[index + 1]]), gold_times[index])
+                     for index in range(start, end)]
+
+        # the views have to go before the block can be closed
+        del times, ids
+        return summaries
+    finally:
+        block.close()
+
+# splits segments into contiguous (start, end) ranges holding about the same number of times each
+def get_segment_chunks(offsets, chunk_count):
+    segment_count = len(offsets) - 1
+    targets = np.linspace(0, offsets[-1], chunk_count + 1)[1:-1]
+    bounds = np.unique(np.concatenate(([0], np.searchsorted(offsets, targets, side='right') - 1, [segment_count])))
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+# get_segment_summary for many segments at once across workers processes. the histories are copied once into shared
+# memory (see share_histories) and every worker reads its segments from there instead of being sent its own copy.
+# histories and gold_times (seconds or None) are in segment order, so are the returned segment_summary()s
+def get_segment_summaries(histories, gold_times, workers):
+    if workers <= 1 or len(histories) <= 1:
+        return [get_segment_summary(history, gold_time) for history, gold_time in zip(histories, gold_times)]
+
+    block, offsets = share_histories(histories)
+    try:
+        chunks = get_segment_chunks(offsets, workers * CHUNKS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            futures = [executor.submit(summarize_shared_segments, block.name, offsets, gold_times, start, end) for start, end in chunks]
+            return [summary for future in futures for summary in future.result()]
+    finally:
+        block.close()
+        block.unlink()
@@ -0,0 +1,97 @@
+# Imports
+import os
+
+# Dependencies
+import numpy as np
+
+# Locals
+from lss import simulation_result
+from lssHelper import log, format_realtime, format_rate
+from lssMatrix import build_attempt_matrix, get_reset_funnel
+from lssProfile import profiled
+
+# how many runs simulate_runs simulates by default, and how many are drawn at once
+SIMULATED_RUNS = 200000
+SIMULATION_BATCH = 25000
+
+# each segment's times are sampled from its most recent SIMULATION_WINDOW times
+SIMULATION_WINDOW = 500
+
+# finish time percentiles written by write_simulation
+FINISH_PERCENTILES = (5, 25, 50, 75, 95)
+
+# the times each segment is sampled from: its most recent window times (times covering skipped splits left out),
+# each equally likely. no outliers are dropped, a choke is a real outcome of a run.
+# raises ValueError if a segment has no times
+def get_segment_samplers(split_data, window=SIMULATION_WINDOW):
+    samplers = []
+    for current_segment in split_data.segments:
+        times = current_segment.segment_history.times[-window:]
+        if len(times) == 0:
+            raise ValueError(f'No times to simulate segment {current_segment.name!r} with')
+        samplers.append(times)
+    return samplers
+
+# the chance of resetting in each segment once it's reached, from every attempt so far (see get_reset_funnel)
+def get_reset_probabilities(split_data):
+    funnel = get_reset_funnel(build_attempt_matrix(split_data))
+    return np.nan_to_num(funnel.reset_rate / 100)
+
+# simulates runs runs segment by segment with the random generator seeded by seed_sequence: each segment resets with its
+# reset probability, otherwise takes one of its sampler's times. returns the finish times, NaN for runs that were reset
+def simulate_batch(samplers, reset_probabilities, runs, seed_sequence):
+    rng = np.random.default_rng(seed_sequence)
+    finish_times = np.zeros(runs)
+    alive = np.ones(runs, dtype=bool)
+    for times, reset_probability in zip(samplers, reset_probabilities):
+        alive &= rng.random(runs) >= reset_probability
+        finish_times += times[rng.integers(len(times), size=runs)]
+    finish_times[~alive] = np.nan
+    return finish_times
+
+# estimates the chance of beating the PB and the finish time distribution by simulating runs runs (see simulate_batch),
+# SIMULATION_BATCH at a time spread over workers processes. every batch gets its own seed spawned from seed, so the
+# result only depends on seed and runs, not on workers. with resets False every simulated run finishes.
+# returns a simulation_result(), raises ValueError if a segment has no times
+@profiled()
+def simulate_runs(split_data, runs=SIMULATED_RUNS, seed=0, workers=1, window=SIMULATION_WINDOW, resets=True):
+    samplers = get_segment_samplers(split_data, window)
+    reset_probabilities = get_reset_probabilities(split_data) if resets else np.zeros(len(samplers))
+
+    batch_runs = [min(SIMULATION_BATCH, runs - start) for start in range(0, runs, SIMULATION_BATCH)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(batch_runs))
+    batch_count = len(batch_runs)
+    if workers <= 1 or batch_count <= 1:
+        batches = [simulate_batch(samplers, reset_probabilities, count, seed_sequence) for count, seed_sequence in zip(batch_runs, seed_sequences)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, batch_count)) as executor:
+            batches = list(executor.map(simulate_batch, [samplers] * batch_count, [reset_probabilities] * batch_count, batch_runs, seed_sequences))
+    finish_times = np.concatenate(batches) if batches else np.empty(0)
+
+    result = simulation_result(runs, seed, split_data.segments[-1].split_time_pb if split_data.segments else None)
+    result.finish_times = finish_times[~np.isnan(finish_times)]
+    result.finished = len(result.finish_times)
+    if result.pb is not None and runs > 0:
+        beat_pb = np.count_nonzero(result.finish_times < result.pb)
+        result.pb_chance = beat_pb / runs * 100
+        result.pb_chance_finished = beat_pb / result.finished * 100 if result.finished > 0 else None
+    return result
+
+# writes a simulation_result() to <file_name>_simulation.txt: how often runs finish and beat the PB,
+# the average finish time and its percentiles (see FINISH_PERCENTILES)
+@profiled()
+def write_simulation(result, folder_path, file_name):
+    file_path = os.path.join(folder_path, f'{file_name}_simulation.txt')
+    finished_rate = result.finished / result.runs * 100 if result.runs > 0 else None
+    average = float(np.mean(result.finish_times)) if result.finished > 0 else None
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write(f'Simulated Runs:       {result.runs} (seed {result.seed})\n')
+        file.write(f'Runs Finished:        {format_rate(finished_rate, "0")}\n')
+        file.write(f'Personal Best:        {format_realtime(result.pb, "none")}\n')
+        file.write(f'Chance to PB:         {format_rate(result.pb_chance, "?")} of attempts, {format_rate(result.pb_chance_finished, "?")} of finished runs\n')
+        file.write(f'Average Finish Time:  {format_realtime(average)}\n')
+        if result.finished > 0:
+            for percentile, finish_time in zip(FINISH_PERCENTILES, np.percentile(result.finish_times, FINISH_PERCENTILES)):
+                file.write(f'{percentile:>3}% finish within:   {format_realtime(float(finish_time))}\n')
+    log('Successfully output simulated runs to', file_path)
@@ -0,0 +1,21 @@
+# Imports
+import os
+import sys
+
+# the scripts import each other by module name from src, like when run from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# Dependencies
+import pytest
+
+# Locals
+from lssBenchmark import make_synthetic_lss
+from lssParser import stream_lss_file
+
+# an lss() read from a synthetic file (see make_synthetic_lss): 10 segments, 3000 attempts
+@pytest.fixture(scope='session')
+def synthetic_split_data(tmp_path_factory):
+    folder_path = tmp_path_factory.mktemp('synthetic')
+    file_path = os.path.join(folder_path, 'synthetic.lss')
+    make_synthetic_lss(file_path, segment_count=10, attempt_count=3000, seed=3)
+    return stream_lss_file(file_path, str(folder_path))
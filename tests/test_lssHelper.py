@@ -0,0 +1,243 @@
+# Dependencies
+import numpy as np
+import pytest
+
+# Locals
+from lss import running_stats, time_history
+from lssHelper import RUNNING_QUANTILES, P2_MARKERS, get_quantile_markers, get_running_quantile, get_segment_summary, get_weights, update_running_stats
+from lssHelper import format_realtime, realtime_to_seconds, seconds_to_realtime, seconds_to_realtimes, times_to_seconds
+from lssHelper import get_rolling_quantiles, get_rolling_std_dev, get_rolling_stats, reconcile_skipped_splits
+
+#-----------------------------------
+# Skipped splits
+#-----------------------------------
+
+# runs reconcile_skipped_splits over segment histories given as lists of attempt ids (each time is id * 10 + segment),
+# passing on the oldest attempt of the previous segment like the parser does.
+# returns (kept ids, combined ids, skipped_from) for each segment
+def reconcile(segment_ids):
+    last_seen = np.full(0, -1, dtype=np.int32)
+    previous_oldest_id = None
+    reconciled = []
+    for index, ids in enumerate(segment_ids):
+        ids = np.array(ids, dtype=np.int32)
+        history = time_history(ids, ids * 10.0 + index)
+        kept, combined, skipped_from, last_seen = reconcile_skipped_splits(last_seen, index, previous_oldest_id, history)
+        assert np.array_equal(kept.times, kept.ids * 10.0 + index) and np.array_equal(combined.times, combined.ids * 10.0 + index)
+        reconciled.append((kept.ids.tolist(), combined.ids.tolist(), skipped_from.tolist()))
+        previous_oldest_id = min((time_id for time_id in ids.tolist() if time_id > 0), default=None)
+    return reconciled
+
+def test_reconcile_skipped_splits():
+    reconciled = reconcile([
+        [2, 3, 4, 5],
+        # attempt 1 is older than the previous segment's history (added later), 3 skipped this split
+        [1, 2, 4, 5],
+        # a manually added time, 3's time covers the skipped segment, 5 reset
+        [-1, 1, 2, 3, 4],
+        # 2 skipped this split, 4 reset
+        [1, 3],
+        [1, 2, 3],
+    ])
+    assert reconciled == [
+        ([2, 3, 4, 5], [], []),
+        ([1, 2, 4, 5], [], []),
+        ([-1, 1, 2, 4], [3], [1]),
+        ([1, 3], [], []),
+        ([1, 3], [2], [3]),
+    ]
+
+# attempts that skip several splits in a row, and an attempt far beyond the ones seen so far that covers every segment before it
+def test_reconcile_many_skipped_splits():
+    reconciled = reconcile([[1, 2, 3], [1], [1], [1, 2, 1000], [2, 3, 1000]])
+    assert reconciled == [
+        ([1, 2, 3], [], []),
+        ([1], [], []),
+        ([1], [], []),
+        ([1], [2, 1000], [1, 0]),
+        ([2, 1000], [3], [1]),
+    ]
+
+# random attempts skipping random splits: every time is combined back to just after the last segment its attempt reached
+def test_reconcile_random_skipped_splits():
+    rng = np.random.default_rng(0)
+    attempt_count, segment_count = 500, 8
+    reached = rng.integers(1, segment_count + 1, attempt_count)
+    recorded = (np.arange(segment_count) < reached[:, None]) & ((rng.random((attempt_count, segment_count)) > 0.2) | (np.arange(segment_count) == reached[:, None] - 1))
+    recorded[:, 0] = True
+    segment_ids = [(np.flatnonzero(recorded[:, index]) + 1).tolist() for index in range(segment_count)]
+    
+    for index, (kept, combined, skipped_from) in enumerate(reconcile(segment_ids)):
+        assert sorted(kept + combined) == segment_ids[index]
+        for attempt_id in kept:
+            assert index == 0 or recorded[attempt_id - 1, index - 1]
+        for attempt_id, first_segment in zip(combined, skipped_from):
+            assert first_segment == np.flatnonzero(recorded[attempt_id - 1, :index])[-1] + 1
+
+#-----------------------------------
+# Converting times
+#-----------------------------------
+
+@pytest.mark.parametrize('time_str', ['00:00:00.0000000', '00:01:02.5000000', '01:59:59.9999999', '99:59:59.0000001',
+                                      '123:04:05.0600000', '-00:00:02.0000000', '-00:00:00.0000001', '-01:02:03.4000000'])
+def test_realtime_round_trip(time_str):
+    seconds = realtime_to_seconds(time_str)
+    assert format_realtime(seconds) == time_str
+    assert seconds_to_realtimes([seconds]).tolist() == [time_str]
+    assert times_to_seconds([time_str]).tolist() == [seconds]
+
+# the array versions give exactly what the one-at-a-time ones do, in any shape
+def test_realtimes_match_realtime():
+    rng = np.random.default_rng(0)
+    seconds = np.concatenate((rng.uniform(0, 360000, 10000), rng.uniform(-100, 0, 100), [0.0, 1e-8, -1e-8, 400000.123, np.nan]))
+    time_strs = [seconds_to_realtime(time) if time == time else '' for time in seconds.tolist()]
+    assert seconds_to_realtimes(seconds).tolist() == time_strs
+    assert seconds_to_realtimes(seconds[:10000].reshape(100, 100)).tolist() == np.reshape(time_strs[:10000], (100, 100)).tolist()
+    
+    parsed = times_to_seconds(time_strs + [None, '1.02:03:04.5', '-00:00:01.25'])
+    expected = [realtime_to_seconds(time_str) if time_str else np.nan for time_str in time_strs] + [np.nan, 93784.5, -1.25]
+    assert np.array_equal(parsed, expected, equal_nan=True)
+
+#-----------------------------------
+# Fused statistics
+#-----------------------------------
+
+# the statistics get_segment_summary replaced, one formula at a time
+def remove_outliers(times):
+    q1, q3 = np.percentile(times, [25, 75])
+    iqr = q3 - q1
+    return times[(q1 - 1.5 * iqr <= times) & (times <= q3 + 1.5 * iqr)]
+
+def get_weighted_average(times):
+    filtered_times = remove_outliers(np.sort(times))
+    weights = get_weights(len(filtered_times))
+    return np.sum(weights * filtered_times) / np.sum(weights)
+
+def get_weighted_std_dev(times):
+    recent_times = times[len(times) // 2:]
+    mean_time = np.mean(recent_times)
+    filtered_times = recent_times[np.abs((recent_times - mean_time) / np.std(recent_times)) <= 2.0]
+    return np.sqrt(np.average(np.square(filtered_times - mean_time), weights=get_weights(len(filtered_times))))
+
+# histories with a few big mistakes, so some times are dropped as outliers
+def make_history(count, seed):
+    rng = np.random.default_rng(seed)
+    times = np.round(rng.normal(60, 2, count) + (rng.random(count) < 0.05) * rng.exponential(30, count), 3)
+    return time_history(np.arange(1, count + 1, dtype=np.int32), times)
+
+@pytest.mark.parametrize('count', [4, 5, 20, 101, 1000])
+@pytest.mark.parametrize('seed', range(3))
+def test_segment_summary(count, seed):
+    history = make_history(count, seed)
+    times = history.times
+    gold_time = float(times.min())
+    summary = get_segment_summary(history, gold_time)
+    
+    assert summary.count == count
+    assert summary.total == pytest.approx(np.sum(times))
+    assert (summary.best, summary.best_id) == (gold_time, int(history.ids[np.argmin(times)]))
+    assert (summary.worst, summary.worst_id) == (float(times.max()), int(history.ids[np.argmax(times)]))
+    assert summary.gold_id == int(history.ids[np.flatnonzero(times == gold_time)[0]])
+    assert (summary.q1, summary.q3) == pytest.approx(np.percentile(times, [25, 75]))
+    assert summary.average == pytest.approx(get_weighted_average(times))
+    assert summary.median == pytest.approx(np.median(remove_outliers(times)))
+    assert summary.stdev == pytest.approx(get_weighted_std_dev(times))
+    assert summary.decent_rate == pytest.approx(np.count_nonzero(times - 0.03 * gold_time <= gold_time) / count * 100)
+
+# a gold edited by hand isn't any attempt's time
+def test_segment_summary_manual_gold():
+    summary = get_segment_summary(make_history(20, 0), 1.0)
+    assert summary.gold_id is None
+    assert summary.decent_rate == 0
+
+@pytest.mark.parametrize('times', [[], [61.5], [61.5, 62.0], [61.5, 62.0, 75.0], [60.0] * 10])
+def test_segment_summary_few_times(times):
+    history = time_history(np.arange(1, len(times) + 1, dtype=np.int32), np.array(times, dtype=np.float64))
+    summary = get_segment_summary(history, None)
+    
+    assert summary.count == len(times)
+    if times:
+        assert summary.median == np.median(times)
+        assert summary.stdev is not None and summary.stdev == summary.stdev
+    else:
+        assert summary.stdev is None and summary.average is None
+
+#-----------------------------------
+# Running statistics
+#-----------------------------------
+
+# a few times read at once, one at a time, or split so the markers are placed partway through a batch
+@pytest.mark.parametrize('count', range(1, 11))
+@pytest.mark.parametrize('batch_size', [1, 3, 4, 10])
+def test_running_quantiles_of_few_times(count, batch_size):
+    times = np.random.default_rng(count).normal(60, 5, count)
+    running = running_stats()
+    for start in range(0, count, batch_size):
+        update_running_stats(running, times[start:start + batch_size])
+    
+    assert running.count == count
+    assert running.best == times.min() and running.worst == times.max()
+    for index, quantile in enumerate(RUNNING_QUANTILES):
+        estimate = get_running_quantile(running, index)
+        if count < P2_MARKERS:
+            assert estimate == pytest.approx(np.quantile(times, quantile))
+        else:
+            assert times.min() <= estimate <= times.max()
+
+# the markers sit on distinct ranks from the minimum to the maximum, the quantile's within 2 ranks of where it should be
+@pytest.mark.parametrize('count', range(P2_MARKERS, 11))
+@pytest.mark.parametrize('quantile', RUNNING_QUANTILES)
+def test_quantile_markers(count, quantile):
+    sorted_times = np.sort(np.random.default_rng(count).normal(60, 5, count))
+    heights, positions, desired = get_quantile_markers(sorted_times, quantile)
+    
+    assert positions[0] == 1 and positions[-1] == count
+    assert all(lower < upper for lower, upper in zip(positions, positions[1:]))
+    assert heights == [sorted_times[position - 1] for position in positions]
+    assert heights[0] == np.quantile(sorted_times, 0) and heights[-1] == np.quantile(sorted_times, 1)
+    
+    rank = quantile * (count - 1)
+    assert sorted_times[max(int(np.floor(rank)) - 1, 0)] <= heights[2] <= sorted_times[min(int(np.ceil(rank)) + 1, count - 1)]
+    assert sorted_times[int(np.floor(rank))] <= np.quantile(sorted_times, quantile) <= sorted_times[int(np.ceil(rank))]
+
+# over many times the sketches stay close to the exact quantiles
+def test_running_quantiles_of_many_times():
+    times = np.random.default_rng(0).normal(60, 5, 5000)
+    running = running_stats()
+    for start in range(0, len(times), 7):
+        update_running_stats(running, times[start:start + 7])
+    
+    assert running.mean == pytest.approx(np.mean(times))
+    assert (running.m2 / running.count) ** 0.5 == pytest.approx(np.std(times))
+    for index, quantile in enumerate(RUNNING_QUANTILES):
+        assert get_running_quantile(running, index) == pytest.approx(np.quantile(times, quantile), abs=0.25)
+
+#-----------------------------------
+# Rolling statistics
+#-----------------------------------
+
+# every window against sorting it again, including ties and windows longer than the history
+@pytest.mark.parametrize('window', [1, 2, 5, 50, 2000])
+@pytest.mark.parametrize('seed', range(3))
+def test_rolling_stats_match_each_window(window, seed):
+    rng = np.random.default_rng(seed)
+    times = np.concatenate((rng.normal(60, 3, 500), np.round(rng.normal(60, 3, 500)), rng.normal(45, 1, 500)))
+    quantiles = get_rolling_quantiles(times, window)
+    std_devs = get_rolling_std_dev(times, window)
+    
+    for index in range(len(times)):
+        window_times = times[max(index - window + 1, 0):index + 1]
+        assert quantiles[index] == pytest.approx(np.quantile(window_times, RUNNING_QUANTILES))
+        assert std_devs[index] == pytest.approx(np.std(window_times), abs=1e-9)
+
+def test_rolling_stats_of_history():
+    history = time_history(np.arange(1, 101, dtype=np.int32), np.random.default_rng(0).normal(60, 3, 100))
+    rolling = get_rolling_stats(history, 10)
+    
+    assert rolling.window == 10
+    assert np.array_equal(rolling.ids, history.ids)
+    assert rolling.median[-1] == pytest.approx(np.median(history.times[-10:]))
+    assert rolling.q1[-1] == pytest.approx(np.percentile(history.times[-10:], 25))
+    assert rolling.q3[-1] == pytest.approx(np.percentile(history.times[-10:], 75))
+    assert rolling.stdev[-1] == pytest.approx(np.std(history.times[-10:]))
+    assert len(get_rolling_stats(time_history()).median) == 0
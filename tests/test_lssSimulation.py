@@ -0,0 +1,36 @@
+# Dependencies
+import numpy as np
+import pytest
+
+# Locals
+from lss import lss, segment_data
+from lssSimulation import SIMULATION_BATCH, simulate_runs
+
+# the same seed gives the same runs, however many processes draw them
+def test_simulation_is_seeded(synthetic_split_data):
+    runs = 2 * SIMULATION_BATCH + 1000
+    result = simulate_runs(synthetic_split_data, runs=runs, seed=7)
+    
+    assert np.array_equal(result.finish_times, simulate_runs(synthetic_split_data, runs=runs, seed=7).finish_times)
+    assert np.array_equal(result.finish_times, simulate_runs(synthetic_split_data, runs=runs, seed=7, workers=2).finish_times)
+    assert not np.array_equal(result.finish_times, simulate_runs(synthetic_split_data, runs=runs, seed=8).finish_times)
+
+# simulated runs finish about as fast as the recent real ones, and sometimes beat the PB
+def test_simulated_finish_times(synthetic_split_data):
+    result = simulate_runs(synthetic_split_data, runs=SIMULATION_BATCH, seed=1)
+    recent_runs = list(synthetic_split_data.finished_run_times.values())[-100:]
+    
+    assert np.median(result.finish_times) == pytest.approx(np.median(recent_runs), rel=0.01)
+    assert result.pb == min(synthetic_split_data.finished_run_times.values())
+    assert 0 < result.pb_chance < result.pb_chance_finished < 5
+    assert 0 < result.finished < result.runs
+
+# without resets every run finishes
+def test_simulation_without_resets(synthetic_split_data):
+    result = simulate_runs(synthetic_split_data, runs=1000, seed=1, resets=False)
+    assert result.finished == 1000
+    assert result.pb_chance == result.pb_chance_finished
+
+def test_simulation_needs_times():
+    with pytest.raises(ValueError):
+        simulate_runs(lss(segments=[segment_data(name='Never Run')]), runs=10)